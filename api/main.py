@@ -1,31 +1,79 @@
 """
 API for handling webhook events and managing Redis-based memory.
 
-This module provides endpoints for webhook processing and configuration management.
+This module provides endpoints for webhook ingestion and configuration management.
 """
 
+import asyncio
+import contextlib
 import logging
 import os
-from datetime import datetime
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
-import redis
-import requests
 from fastapi import FastAPI, Request
-from openai import OpenAI
 
 from app.prompts.atendimento import PROMPT_ASSISTENTE
-from src.memory import RedisManager
+from src.assistant import (
+    ReplyDeliveredError,
+    parse_message_event,
+    process_message,
+)
+from src.clients import ClientRegistry
+from src.event_filters import EventFilter
+from src.idempotency import IdempotencyGuard
+from src.knowledge import KnowledgeBase
+from src.lock import ChatLock
+from src.memory import AsyncRedisManager, get_async_redis
+from src.message_queue import MessageQueue
+from src.metrics import flush_metrics, flush_metrics_periodically, read_metrics
+from src.prompt_registry import AsyncPromptRegistry
+from src.semantic_cache import SEMANTIC_CACHE, SemanticCache
 
 logging.getLogger("uvicorn.access").addFilter(
     lambda record: "flutter_service_worker.js" not in record.getMessage()
 )
 
-app = FastAPI()
 
-# Initialize Redis client
-redis_client = redis.Redis.from_url(
-    os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Create the shared OpenAI and WAHA clients (and, when answering inline,
+    the semantic answer cache and knowledge base) once per process.
+
+    Args:
+        app: The FastAPI application.
+    """
+    app.state.clients = ClientRegistry()
+    app.state.answers = (
+        SemanticCache(redis_client)
+        if SEMANTIC_CACHE and WEBHOOK_MODE == "inline"
+        else None
+    )
+    app.state.knowledge = KnowledgeBase() if WEBHOOK_MODE == "inline" else None
+    flusher = asyncio.create_task(flush_metrics_periodically(redis_client))
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await flusher
+        await flush_metrics(redis_client)
+        await app.state.clients.aclose()
+        await redis_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Initialize Redis client (shared async connection pool)
+redis_client = get_async_redis(os.getenv("REDIS_URL", "redis://localhost:6379"))
+
+# "queue" hands messages to api/worker.py, "inline" answers inside the request
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "queue")
+message_queue = MessageQueue(redis_client)
+prompt_registry = AsyncPromptRegistry(redis_client, PROMPT_ASSISTENTE)
+idempotency = IdempotencyGuard(redis_client)
+event_filter = EventFilter(redis_client)
 
 
 @app.get("/hello")
@@ -36,8 +84,8 @@ async def hello_world() -> dict:
     Returns:
         dict: A dictionary containing the configured message and timestamp.
     """
-    config_manager = RedisManager(redis_client, "config")
-    config = config_manager.get_memory_dict()
+    config_manager = AsyncRedisManager(redis_client, "config")
+    config = await config_manager.get_memory_dict()
     if not config:
         return {"message": "No configuration found!"}
     return {
@@ -61,10 +109,95 @@ async def root(request: Request) -> dict:
     return {"message": "Request received"}
 
 
+@app.get("/metrics")
+async def metrics() -> dict:
+    """
+    Return the counters recorded by the API and the workers.
+
+    Returns:
+        dict: Counters keyed by metrics group, e.g. ``chat_lock`` contention.
+    """
+    await flush_metrics(redis_client)
+    return await read_metrics(redis_client)
+
+
+async def handle_message(request: Request, message: dict) -> dict:
+    """
+    Queue a message, or answer it at once when ``WEBHOOK_MODE=inline``.
+
+    Args:
+        request: The incoming webhook request.
+        message: The message data returned by ``parse_message_event``.
+
+    Returns:
+        dict: Status of the webhook processing.
+    """
+    if WEBHOOK_MODE == "inline":
+        try:
+            async with ChatLock(redis_client, message["phone"]):
+                await process_message(
+                    request.app.state.clients,
+                    redis_client,
+                    message["phone"],
+                    message["body"],
+                    prompt_registry,
+                    request.app.state.answers,
+                    request.app.state.knowledge,
+                )
+            return {"status": "success"}
+        except ReplyDeliveredError as e:
+            # Not an error for WAHA: a redelivery would send the reply again
+            print(f"Error finishing the turn: {e}")
+            return {"status": "success"}
+        except Exception as e:
+            print(f"Error getting assistant response: {e}")
+            return {"status": "error", "message": str(e)}
+
+    entry_id = await message_queue.enqueue(message)
+    return {"status": "queued", "id": entry_id}
+
+
+async def handle_message_once(request: Request, message: dict) -> dict:
+    """
+    Handle a message unless its id was already received.
+
+    Failed deliveries release the id, so the next retry processes it again.
+
+    Args:
+        request: The incoming webhook request.
+        message: The message data returned by ``parse_message_event``.
+
+    Returns:
+        dict: Status of the webhook processing, or the result of the first
+        delivery marked as ``duplicate``.
+    """
+    message_id = message["id"]
+    cached = await idempotency.claim(message_id)
+    if cached is not None:
+        return {**cached, "duplicate": True}
+
+    try:
+        result = await handle_message(request, message)
+    except Exception:
+        await idempotency.release(message_id)
+        raise
+
+    if result["status"] == "error":
+        await idempotency.release(message_id)
+    else:
+        await idempotency.complete(message_id, result)
+    return result
+
+
 @app.post("/webhook")
 async def webhook(request: Request) -> dict:
     """
-    Process incoming webhook events from the messaging service.
+    Validate incoming webhook events and queue them for the workers.
+
+    The reply is produced by ``api/worker.py``, so this handler returns as soon
+    as the message is stored in the queue. Set ``WEBHOOK_MODE=inline`` to answer
+    inside the request instead. Deliveries of a message id that was already
+    received return the first result without processing it again.
 
     Args:
         request: The incoming webhook request containing message data.
@@ -77,70 +210,19 @@ async def webhook(request: Request) -> dict:
         body = await request.json()
         print(body)
 
-        if body["event"] == "message":
-            # Extract message data
-            phone = body["payload"]["from"]
-            message_content = body["payload"]["body"]
-
-            # Get configuration
-            config_manager = RedisManager(redis_client, "config")
-            config = config_manager.get_memory_dict()
-
-            # Initialize chat manager for this user
-            chat_manager = RedisManager(redis_client, f"chat:{phone}")
-            stored_messages = chat_manager.get_memory_dict()
-
-            # Initialize or load message history
-            if not stored_messages or "messages" not in stored_messages:
-                messages = [
-                    {"role": "system", "content": PROMPT_ASSISTENTE.format(**config)}
-                ]
-            else:
-                messages = stored_messages["messages"]
-
-            # Add user message
-            messages.append({"role": "user", "content": message_content})
-
-            # Get assistant response
-            try:
-                api_key = config.get("OPENAI_API_KEY")
-                if not api_key:
-                    raise ValueError("OPENAI_API_KEY not found in Redis config")
-
-                client = OpenAI(api_key=api_key)
-                response = client.chat.completions.create(
-                    model="gpt-4.1",
-                    messages=messages,
-                    temperature=0.7,
-                )
-
-                assistant_message = response.choices[0].message.content
-
-                # Add assistant response to history
-                messages.append({"role": "assistant", "content": assistant_message})
-
-                # Save updated chat history
-                chat_manager.set_memory_dict(
-                    {"messages": messages, "last_updated": datetime.now().isoformat()},
-                    expire_time=3600,
-                )  # 1 hour expiration
-
-                # Send response back to WhatsApp
-                payload = {
-                    "session": "default",
-                    "chatId": phone,
-                    "text": assistant_message,
-                    "linkPreview": False,
-                }
-
-                requests.post("http://waha:3000/api/sendText", json=payload)
-                return {"status": "success"}
+        # Drop own messages, groups, broadcasts and empty bodies without any I/O
+        reason = event_filter.check(body)
+        if reason is not None:
+            return {"status": "success", "message": "Event ignored", "reason": reason}
 
-            except Exception as e:
-                print(f"Error getting assistant response: {e}")
-                return {"status": "error", "message": str(e)}
+        message = parse_message_event(body)
+        if message is None:
+            return {"status": "success", "message": "Non-message event ignored"}
 
-        return {"status": "success", "message": "Non-message event ignored"}
+        # WAHA retries deliveries; replays get the result of the first one
+        if not message["id"]:
+            return await handle_message(request, message)
+        return await handle_message_once(request, message)
 
     except Exception as e:
         print(f"Error processing webhook: {e}")
@@ -0,0 +1,312 @@
+"""
+Worker pool that drains the webhook queue.
+
+Each consumer reads messages queued by ``api/main.py`` and runs the assistant
+turn, so slow completions never hold up webhook ingestion.
+
+The queue shards are split between the consumers and every consumer handles
+its entries one at a time, so the messages of a conversation are answered in
+the order they arrived. Run a single worker process per deployment to keep that
+guarantee; the per-chat lock still prevents lost updates if more are started.
+
+Messages a customer sends in quick succession are answered together: a
+consumer waits until the chat has been quiet for the burst window
+(``QUEUE_BURST_WINDOW_MS``) and runs one turn with all of them, answering the
+other chats of its shards meanwhile.
+
+The same process runs the compactor, which summarizes long conversations after
+their replies were sent.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+
+import redis.asyncio
+
+from app.prompts.atendimento import PROMPT_ASSISTENTE, PROMPT_RESUMO
+from src.assistant import ReplyDeliveredError, process_message
+from src.clients import ClientRegistry
+from src.compaction import Compactor
+from src.knowledge import KnowledgeBase
+from src.lock import ChatLock
+from src.memory import get_async_redis
+from src.message_queue import MessageQueue
+from src.metrics import Metrics, flush_metrics, flush_metrics_periodically
+from src.prompt_registry import AsyncPromptRegistry
+from src.semantic_cache import SEMANTIC_CACHE, SemanticCache
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+WORKER_CLAIM_IDLE_MS = int(os.getenv("WORKER_CLAIM_IDLE_MS", "300000"))
+WORKER_READ_COUNT = int(os.getenv("WORKER_READ_COUNT", "10"))
+WORKER_BURST_MAX_WAIT_MS = int(os.getenv("WORKER_BURST_MAX_WAIT_MS", "10000"))
+
+
+async def handle_burst(
+    queue: MessageQueue,
+    clients: ClientRegistry,
+    redis_client: redis.asyncio.Redis,
+    prompts: AsyncPromptRegistry,
+    answers: SemanticCache | None,
+    knowledge: KnowledgeBase,
+    entries: list[tuple[str, str, dict]],
+) -> None:
+    """
+    Answer a burst of queued messages of one chat in a single turn.
+
+    The messages are joined into one user message and acknowledged together.
+    Failed turns are retried in place, so later messages of the same chat wait
+    for them, until ``WORKER_MAX_ATTEMPTS`` is reached and the entries are
+    moved to the dead-letter stream. Turns that failed after the reply was
+    sent are acknowledged without a retry.
+
+    Args:
+        queue: The message queue the entries came from
+        clients: Shared OpenAI and WAHA clients
+        redis_client: Async Redis client shared by the turns and the queue
+        prompts: Registry of the assistant system prompts
+        answers: Semantic cache of answers, if enabled
+        knowledge: Knowledge base of business documents
+        entries: Stream, entry id and message of each entry, oldest first
+    """
+    valid = await drop_invalid(queue, entries)
+    if not valid:
+        return
+
+    stream = valid[0][0]
+    phone = valid[0][2]["phone"]
+    body = "\n".join(message["body"] for _, _, message in valid)
+
+    error = await run_turn(
+        clients, redis_client, prompts, answers, knowledge, phone, body, valid[0][1]
+    )
+    if error is not None:
+        for stream, entry_id, message in valid:
+            await queue.dead_letter(stream, entry_id, message, error)
+        return
+
+    # The reply was sent: a failure from here on must not run the turn again
+    metrics = Metrics(redis_client, "burst")
+    metrics.add("turns")
+    metrics.add("messages", len(valid))
+    try:
+        await queue.ack(stream, *(entry_id for _, entry_id, _ in valid))
+    except Exception as e:
+        logger.error(f"Error acknowledging the burst of {valid[0][1]}: {e}")
+
+
+async def drop_invalid(
+    queue: MessageQueue, entries: list[tuple[str, str, dict]]
+) -> list[tuple[str, str, dict]]:
+    """Move the entries without a phone or body to the dead-letter stream."""
+    valid = []
+    for stream, entry_id, message in entries:
+        if message.get("phone") and message.get("body"):
+            valid.append((stream, entry_id, message))
+        else:
+            await queue.dead_letter(stream, entry_id, message, "invalid message")
+    return valid
+
+
+async def run_turn(
+    clients: ClientRegistry,
+    redis_client: redis.asyncio.Redis,
+    prompts: AsyncPromptRegistry,
+    answers: SemanticCache | None,
+    knowledge: KnowledgeBase,
+    phone: str,
+    body: str,
+    entry_id: str,
+) -> str | None:
+    """
+    Run one turn under the chat lock, retrying it up to ``WORKER_MAX_ATTEMPTS``.
+
+    Args:
+        clients: Shared OpenAI and WAHA clients
+        redis_client: Async Redis client shared by the turns and the queue
+        prompts: Registry of the assistant system prompts
+        answers: Semantic cache of answers, if enabled
+        knowledge: Knowledge base of business documents
+        phone: WhatsApp chat id of the customer
+        body: Joined text of the burst
+        entry_id: Id of the first entry of the burst, for the logs
+
+    Returns:
+        str | None: The error of the last attempt, or None if the reply was sent
+    """
+    for attempt in range(1, WORKER_MAX_ATTEMPTS + 1):
+        try:
+            async with ChatLock(redis_client, phone):
+                await process_message(
+                    clients, redis_client, phone, body, prompts, answers, knowledge
+                )
+            return None
+        except ReplyDeliveredError as e:
+            # Retrying would send the reply again
+            logger.error(f"Error finishing the turn of {entry_id}: {e}")
+            return None
+        except Exception as e:
+            logger.error(
+                f"Error getting assistant response for {entry_id} "
+                f"(attempt {attempt}/{WORKER_MAX_ATTEMPTS}): {e}"
+            )
+            error = str(e)
+            if attempt < WORKER_MAX_ATTEMPTS:
+                await asyncio.sleep(2**attempt)
+    return error
+
+
+async def next_burst(
+    queue: MessageQueue,
+    consumer: str,
+    shards: list[int],
+    backlog: list[tuple[str, str, dict]],
+    deadlines: dict[str, float],
+) -> tuple[list[tuple[str, str, dict]], list[tuple[str, str, dict]]]:
+    """
+    Take the messages of the oldest chat in the backlog that went quiet.
+
+    A chat is ready once no message of it arrived for the queue's burst
+    window, or ``WORKER_BURST_MAX_WAIT_MS`` after it was first seen. Chats
+    still bursting are skipped, so they never hold up the other chats of the
+    shards; the entries queued while every chat is bursting are read in.
+    Entries of one chat keep their order.
+
+    Args:
+        queue: The message queue to drain
+        consumer: Unique consumer name
+        shards: Shards owned by this consumer
+        backlog: Entries read and not processed yet, oldest first
+        deadlines: Time by which each waiting chat is answered, kept by the
+            consumer between calls
+
+    Returns:
+        tuple: The entries of the burst and the remaining backlog
+    """
+    while True:
+        for index, entry in enumerate(backlog):
+            if not entry[2].get("phone"):
+                rest = list(backlog)
+                del rest[index]
+                return [entry], rest
+
+        phones = list(dict.fromkeys(entry[2]["phone"] for entry in backlog))
+        waits = await queue.burst_waits(phones)
+        now = time.monotonic()
+        for phone in phones:
+            deadline = deadlines.setdefault(
+                phone, now + WORKER_BURST_MAX_WAIT_MS / 1000
+            )
+            if waits[phone] <= 0 or now >= deadline:
+                del deadlines[phone]
+                burst = [entry for entry in backlog if entry[2]["phone"] == phone]
+                rest = [entry for entry in backlog if entry[2]["phone"] != phone]
+                return burst, rest
+
+        await asyncio.sleep(
+            min(min(waits.values()), min(deadlines[p] for p in phones) - now)
+        )
+        backlog = backlog + await queue.read(
+            consumer, shards, count=WORKER_READ_COUNT, block_ms=None
+        )
+
+
+async def consume(
+    queue: MessageQueue,
+    clients: ClientRegistry,
+    redis_client: redis.asyncio.Redis,
+    prompts: AsyncPromptRegistry,
+    answers: SemanticCache | None,
+    knowledge: KnowledgeBase,
+    consumer: str,
+    shards: list[int],
+) -> None:
+    """
+    Read and process the entries of some shards forever.
+
+    Args:
+        queue: The message queue to drain
+        clients: Shared OpenAI and WAHA clients
+        redis_client: Async Redis client shared by the turns and the queue
+        prompts: Registry of the assistant system prompts
+        answers: Semantic cache of answers, if enabled
+        knowledge: Knowledge base of business documents
+        consumer: Unique consumer name
+        shards: Shards owned by this consumer
+    """
+    backlog: list[tuple[str, str, dict]] = []
+    deadlines: dict[str, float] = {}
+    while True:
+        try:
+            if not backlog:
+                backlog = await queue.claim_stale(
+                    consumer, shards, WORKER_CLAIM_IDLE_MS, count=WORKER_READ_COUNT
+                )
+            if not backlog:
+                backlog = await queue.read(consumer, shards, count=WORKER_READ_COUNT)
+            if not backlog:
+                continue
+            burst, backlog = await next_burst(
+                queue, consumer, shards, backlog, deadlines
+            )
+            await handle_burst(
+                queue, clients, redis_client, prompts, answers, knowledge, burst
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading the queue: {e}")
+            await asyncio.sleep(1)
+
+
+async def main() -> None:
+    """Run ``WORKER_CONCURRENCY`` consumers over the shards and the compactor."""
+    redis_client = get_async_redis(REDIS_URL)
+    queue = MessageQueue(redis_client)
+    await queue.ensure_group()
+    clients = ClientRegistry()
+    prompts = AsyncPromptRegistry(redis_client, PROMPT_ASSISTENTE)
+    answers = SemanticCache(redis_client) if SEMANTIC_CACHE else None
+    knowledge = KnowledgeBase()
+    compactor = Compactor(redis_client, clients, PROMPT_RESUMO)
+
+    concurrency = min(WORKER_CONCURRENCY, queue.shards)
+    if concurrency < WORKER_CONCURRENCY:
+        logger.warning(f"WORKER_CONCURRENCY limited to {concurrency} by QUEUE_SHARDS")
+
+    worker_name = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"Starting {concurrency} consumers as {worker_name}")
+
+    try:
+        await asyncio.gather(
+            *(
+                consume(
+                    queue,
+                    clients,
+                    redis_client,
+                    prompts,
+                    answers,
+                    knowledge,
+                    f"{worker_name}-{i}",
+                    list(range(i, queue.shards, concurrency)),
+                )
+                for i in range(concurrency)
+            ),
+            compactor.run(),
+            flush_metrics_periodically(redis_client),
+        )
+    finally:
+        await flush_metrics(redis_client)
+        await clients.aclose()
+        await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -2,15 +2,24 @@
 Chatbot interface using Streamlit's chat components and Redis for memory management.
 """
 
-import os
 from datetime import datetime
 
+import openai
 import redis
 import streamlit as st
-from openai import OpenAI
 
-from app.prompts.atendimento import PROMPT_ASSISTENTE
-from src.memory import RedisManager
+from app.rendering import StreamRenderer
+from app.resources import (
+    get_openai,
+    get_prompt_registry,
+    get_redis,
+    invalidate_api_key,
+    validate_api_key,
+)
+from src.memory import MemoryBatch, RedisManager
+
+# Messages rendered on load and added by each "load older" click
+CHAT_PAGE_SIZE = 20
 
 # Page configuration
 st.set_page_config(
@@ -20,19 +29,26 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# Initialize Redis client
+# Shared Redis client, connected once per process
 try:
-    redis_client = redis.Redis.from_url(
-        os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
-    )
-    redis_client.ping()  # Check connection
+    redis_client = get_redis()
 except redis.exceptions.ConnectionError as e:
     st.error(f"Não foi possível conectar ao Redis. Verifique se os serviços estão rodando. Detalhes: {e}")
     st.stop()
 
+# Load API key and configuration in one round trip; the stored chat history
+# is only needed when the session starts
+batch = (
+    MemoryBatch(redis_client)
+    .load_fields("secrets:openai_api_key", "key")
+    .load("config")
+)
+if "messages" not in st.session_state:
+    batch.load("chat_history")
+memory = batch.execute()
+
 # --- API Key and Client Initialization ---
-openai_api_key_manager = RedisManager(redis_client, "secrets:openai_api_key")
-api_key = openai_api_key_manager.get_memory_dict().get('key')
+api_key = memory["secrets:openai_api_key"].get('key')
 
 if not api_key:
     st.warning("⚠️ A chave da API da OpenAI não foi configurada.")
@@ -40,22 +56,20 @@ if not api_key:
         st.switch_page("pages/Configurações.py")
     st.stop()
 
-try:
-    client = OpenAI(api_key=api_key)
-    client.models.list()  # Test the key
-except Exception as e:
-    st.error(f"A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações. Erro: {e}")
+# The key is checked once per validation TTL, not on every rerun
+if not validate_api_key(api_key):
+    st.error("A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações.")
     if st.button("Ir para Configurações"):
         st.switch_page("pages/Configurações.py")
     st.stop()
 
-# Initialize config manager
-config_manager = RedisManager(redis_client, "config")
-config = config_manager.get_memory_dict()
+client = get_openai(api_key)
+
+config = memory["config"]
 
 # Initialize Redis manager for persistent chat history
 chat_manager = RedisManager(redis_client, "chat_history")
-stored_messages = chat_manager.get_memory_dict()
+stored_messages = memory.get("chat_history")
 
 if not config:
     config = {
@@ -68,27 +82,49 @@ if not config:
         "instructions": "",
     }    
 
+# The system prompt is rendered once per configuration and stored by version
+prompt_version, system_prompt = get_prompt_registry().current(config)
+
 # Initialize session state for chat history
 if "messages" not in st.session_state:
     # Load from Redis if available, otherwise start fresh
     if stored_messages and "messages" in stored_messages:
-        st.session_state.messages = stored_messages["messages"]
-    else:
+        # Histories saved before the prompt registry start with the prompt text
         st.session_state.messages = [
-            {"role": "system", "content": PROMPT_ASSISTENTE.format(**config)},
+            m for m in stored_messages["messages"] if m["role"] != "system"
         ]
+    else:
+        st.session_state.messages = []
+
+if "visible_messages" not in st.session_state:
+    st.session_state.visible_messages = CHAT_PAGE_SIZE
 
 # Chat interface header
 st.header("💬 Assistente Virtual")
 
-# Display chat messages
-for message in st.session_state.messages:
-    if message["role"] == "system":
-        with st.expander("Instruções do Assistente", expanded=False):
+with st.expander("Instruções do Assistente", expanded=False):
+    st.write(system_prompt)
+
+
+# Display only the latest messages, older ones are loaded on demand
+@st.fragment
+def chat_history() -> None:
+    """Render the visible window of the chat history."""
+    hidden = max(len(st.session_state.messages) - st.session_state.visible_messages, 0)
+    if hidden and st.button(f"⬆️ Carregar mensagens anteriores ({hidden})"):
+        st.session_state.visible_messages += CHAT_PAGE_SIZE
+        st.rerun(scope="fragment")
+
+    for message in st.session_state.messages[hidden:]:
+        with st.chat_message(message["role"]):
             st.write(message["content"])
-            continue
-    with st.chat_message(message["role"]):
-        st.write(message["content"])
+
+
+chat_history()
+
+# Error of the last turn, kept across the rerun that redraws the history
+if "chat_error" in st.session_state:
+    st.error(st.session_state.pop("chat_error"))
 
 # Chat input
 if prompt := st.chat_input("Digite sua mensagem..."):
@@ -101,13 +137,12 @@ if prompt := st.chat_input("Digite sua mensagem..."):
 
     # Display assistant response with loading spinner
     with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
+        renderer = StreamRenderer(st.container())
 
         # Get assistant response
         try:
             # Create the messages list for the API call
-            messages_for_api = [
+            messages_for_api = [{"role": "system", "content": system_prompt}] + [
                 {"role": m["role"], "content": m["content"]}
                 for m in st.session_state.messages
             ]
@@ -120,14 +155,13 @@ if prompt := st.chat_input("Digite sua mensagem..."):
                 temperature=0.7,
             )
 
-            # Stream the response
+            # Stream the response, flushing the screen at most every few chunks
             for chunk in response:
                 if chunk.choices[0].delta.content is not None:
-                    full_response += chunk.choices[0].delta.content
-                    message_placeholder.write(full_response + "▌")
+                    renderer.feed(chunk.choices[0].delta.content)
 
             # Update final response
-            message_placeholder.write(full_response)
+            full_response = renderer.close()
 
             # Add assistant response to chat history
             st.session_state.messages.append(
@@ -138,12 +172,43 @@ if prompt := st.chat_input("Digite sua mensagem..."):
             chat_manager.set_memory_dict(
                 {
                     "messages": st.session_state.messages,
+                    "prompt_version": prompt_version,
                     "last_updated": datetime.now().isoformat(),
                 }
             )
 
+        except openai.AuthenticationError:
+            # The key was revoked after it was validated
+            invalidate_api_key()
+            st.session_state.chat_error = "A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações."
         except Exception as e:
-            st.error(f"Ocorreu um erro ao comunicar com a OpenAI: {e}")
+            st.session_state.chat_error = f"Ocorreu um erro ao comunicar com a OpenAI: {e}"
+
+    # Redraw the page so the new turn belongs to the history fragment
+    st.rerun()
+
+
+# The transcript is only built after it is requested
+@st.fragment
+def export_section() -> None:
+    """Render the transcript export, rerunning on its own."""
+    if st.session_state.messages:
+        if st.button("📄 Exportar"):
+            st.session_state.export_requested = True
+
+        if st.session_state.get("export_requested"):
+            chat_text = "\n\n".join(
+                f"{m['role'].upper()}: {m['content']}" for m in st.session_state.messages
+            )
+
+            st.download_button(
+                "📥 Baixar",
+                chat_text,
+                file_name=f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                mime="text/plain",
+                on_click=lambda: st.session_state.pop("export_requested", None),
+            )
+
 
 # Sidebar with chat controls
 with st.sidebar:
@@ -152,18 +217,8 @@ with st.sidebar:
     # Clear chat history button
     if st.button("🗑️ Limpar"):
         st.session_state.messages = []
+        st.session_state.visible_messages = CHAT_PAGE_SIZE
         chat_manager.reset_memory_dict()
         st.rerun()
 
-    # Download chat history
-    if st.session_state.messages:
-        chat_text = "\n\n".join(
-            [f"{m['role'].upper()}: {m['content']}" for m in st.session_state.messages if m['role'] != 'system']
-        )
-
-        st.download_button(
-            "📥 Baixar",
-            chat_text,
-            file_name=f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-            mime="text/plain",
-        )
+    export_section()
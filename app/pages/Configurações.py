@@ -4,14 +4,21 @@ Test page for Redis volume functionality.
 This module provides a UI for testing Redis configuration and persistence.
 """
 
-import os
 from datetime import datetime
 
-import openai
 import redis
 import streamlit as st
 
-from src.memory import RedisManager
+from app.resources import (
+    get_knowledge_base,
+    get_openai,
+    get_redis,
+    invalidate_api_key,
+    pool_stats,
+    validate_api_key,
+)
+from src.ingestion import SUPPORTED_SUFFIXES, KnowledgeIngestor, iter_paragraphs
+from src.memory import MemoryBatch, RedisManager
 
 # --- Utility Functions ---
 
@@ -26,120 +33,205 @@ def show_notification(message, type='info'):
     else:
         st.info(message)
 
-def validate_api_key(api_key: str) -> bool:
-    """Validates the OpenAI API key."""
-    if not api_key or not api_key.strip():
-        return False
-    try:
-        client = openai.OpenAI(api_key=api_key.strip())
-        client.models.list()
-        return True
-    except Exception:
-        return False
-
 # --- Initialization ---
 
 st.set_page_config(page_title="Repense.ai - Configurações", page_icon="⚙️", layout="wide")
 
 try:
-    redis_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+    redis_client = get_redis()  # Shared client, connected once per process
     config_manager = RedisManager(redis_client, "config")
     openai_api_key_manager = RedisManager(redis_client, "secrets:openai_api_key")
 except redis.exceptions.ConnectionError as e:
     st.error(f"Não foi possível conectar ao Redis. Verifique se os serviços estão rodando. Detalhes: {e}")
     st.stop()
 
-# Load existing data
-current_config = config_manager.get_memory_dict()
-api_key_persisted = openai_api_key_manager.get_memory_dict().get('key')
+# Load existing data in one round trip
+memory = (
+    MemoryBatch(redis_client)
+    .load("config")
+    .load_fields("secrets:openai_api_key", "key")
+    .execute()
+)
+current_config = memory["config"]
+api_key_persisted = memory["secrets:openai_api_key"].get('key')
 
 # --- UI Rendering ---
 
 st.title("Configurações Gerais")
 st.write("Gerencie as configurações do seu assistente virtual e da API da OpenAI.")
 
+
 # --- OpenAI API Key Management ---
-st.header("Chave da API OpenAI")
-notification_placeholder = st.empty()
-
-with st.container():
-    api_key_input = st.text_input(
-        "Insira sua chave da API da OpenAI",
-        type="password",
-        placeholder="sk-...",
-        help="Sua chave é armazenada de forma segura e não é compartilhada."
-    )
+@st.fragment
+def api_key_section() -> None:
+    """Renders the OpenAI API key form."""
+    st.header("Chave da API OpenAI")
+    notification_placeholder = st.empty()
+
+    with st.container():
+        api_key_input = st.text_input(
+            "Insira sua chave da API da OpenAI",
+            type="password",
+            placeholder="sk-...",
+            help="Sua chave é armazenada de forma segura e não é compartilhada."
+        )
 
-    if st.button("Salvar/Atualizar Chave da OpenAI"):
-        if validate_api_key(api_key_input):
-            key = api_key_input.strip()
-            openai_api_key_manager.set_memory_dict({'key': key})
-            with notification_placeholder.container():
-                show_notification("✅ Chave da API da OpenAI salva com sucesso!", 'success')
-            st.rerun()
-        else:
-            with notification_placeholder.container():
-                show_notification("❌ Chave da API inválida. Verifique e tente novamente.", 'error')
-
-if not api_key_persisted:
-    with notification_placeholder.container():
-        show_notification(
-            "⚠️ A chave da API da OpenAI não está configurada.",
-            'warning'
+        if st.button("Salvar/Atualizar Chave da OpenAI"):
+            # Drop cached results so the new key is checked now and reused by the pages
+            invalidate_api_key()
+            if validate_api_key(api_key_input):
+                key = api_key_input.strip()
+                openai_api_key_manager.set_field('key', key)
+                with notification_placeholder.container():
+                    show_notification("✅ Chave da API da OpenAI salva com sucesso!", 'success')
+                st.rerun()
+            else:
+                with notification_placeholder.container():
+                    show_notification("❌ Chave da API inválida. Verifique e tente novamente.", 'error')
+
+    if not api_key_persisted:
+        with notification_placeholder.container():
+            show_notification(
+                "⚠️ A chave da API da OpenAI não está configurada.",
+                'warning'
+            )
+    else:
+        with notification_placeholder.container():
+            show_notification(
+                "✅ A chave da API da OpenAI está configurada.",
+                'success'
+            )
+
+
+api_key_section()
+
+st.divider()
+
+
+# --- Assistant Configuration ---
+@st.fragment
+def assistant_config_section() -> None:
+    """Renders the assistant configuration form."""
+    st.header("Configuração do Assistente")
+
+    with st.form("assistant_config_form"):
+        st.subheader("Informações do Negócio")
+        business_name = st.text_input("Nome da Empresa", value=current_config.get("business_name", ""))
+        business_description = st.text_area("Descrição do Negócio", value=current_config.get("business_description", ""), height=100)
+        business_segment = st.selectbox(
+            "Segmento",
+            ["Varejo", "Serviços", "Tecnologia", "Saúde", "Educação", "Outro"],
+            index=["Varejo", "Serviços", "Tecnologia", "Saúde", "Educação", "Outro"].index(current_config.get("business_segment", "Varejo"))
         )
-else:
-    with notification_placeholder.container():
-        show_notification(
-            "✅ A chave da API da OpenAI está configurada.",
-            'success'
+
+        st.subheader("Personalidade do Assistente")
+        assistant_name = st.text_input("Nome do Assistente", value=current_config.get("assistant_name", ""))
+        tone = st.select_slider(
+            "Tom de Voz",
+            options=["profissional", "amigável", "casual", "entusiasmado"],
+            value=current_config.get("tone", "profissional")
         )
+        use_emojis = st.toggle("Usar Emojis", value=current_config.get("use_emojis", True))
+        instructions = st.text_area("Instruções Adicionais", value=current_config.get("instructions", ""), height=100)
+
+        submit_button = st.form_submit_button("Salvar Configurações do Assistente", use_container_width=True)
+
+        if submit_button:
+            if not api_key_persisted:
+                show_notification("❌ Por favor, salve uma chave da API da OpenAI válida antes de salvar as configurações.", 'error')
+            else:
+                config_data = {
+                    "business_name": business_name,
+                    "business_description": business_description,
+                    "business_segment": business_segment,
+                    "assistant_name": assistant_name,
+                    "tone": tone,
+                    "use_emojis": use_emojis,
+                    "instructions": instructions,
+                    "last_updated": datetime.now().isoformat(),
+                }
+                try:
+                    config_manager.set_memory_dict(config_data)
+                    show_notification("✅ Configurações do assistente salvas com sucesso!", 'success')
+                    persistence = config_manager.persistence.stats()
+                    st.caption(
+                        f"Persistência: {persistence['mode']} "
+                        f"({persistence['avg_latency_ms']:.1f} ms por gravação)"
+                    )
+                except Exception as e:
+                    show_notification(f"❌ Erro ao salvar as configurações: {e}", 'error')
+
+
+assistant_config_section()
 
 st.divider()
 
-# --- Assistant Configuration ---
-st.header("Configuração do Assistente")
-
-with st.form("assistant_config_form"):
-    st.subheader("Informações do Negócio")
-    business_name = st.text_input("Nome da Empresa", value=current_config.get("business_name", ""))
-    business_description = st.text_area("Descrição do Negócio", value=current_config.get("business_description", ""), height=100)
-    business_segment = st.selectbox(
-        "Segmento",
-        ["Varejo", "Serviços", "Tecnologia", "Saúde", "Educação", "Outro"],
-        index=["Varejo", "Serviços", "Tecnologia", "Saúde", "Educação", "Outro"].index(current_config.get("business_segment", "Varejo"))
-    )
 
-    st.subheader("Personalidade do Assistente")
-    assistant_name = st.text_input("Nome do Assistente", value=current_config.get("assistant_name", ""))
-    tone = st.select_slider(
-        "Tom de Voz",
-        options=["profissional", "amigável", "casual", "entusiasmado"],
-        value=current_config.get("tone", "profissional")
+# --- Knowledge Base ---
+@st.fragment
+def knowledge_base_section() -> None:
+    """Renders the knowledge base documents and import."""
+    st.header("Base de Conhecimento")
+    st.write(
+        "Importe catálogos, FAQs e documentos da empresa. O assistente consulta apenas "
+        "os trechos relevantes para cada mensagem."
     )
-    use_emojis = st.toggle("Usar Emojis", value=current_config.get("use_emojis", True))
-    instructions = st.text_area("Instruções Adicionais", value=current_config.get("instructions", ""), height=100)
 
-    submit_button = st.form_submit_button("Salvar Configurações do Assistente", use_container_width=True)
+    knowledge = get_knowledge_base()
+    uploaded_files = st.file_uploader(
+        "Documentos (TXT, Markdown, CSV ou PDF)",
+        type=[suffix.lstrip(".") for suffix in SUPPORTED_SUFFIXES],
+        accept_multiple_files=True,
+    )
 
-    if submit_button:
+    if st.button("Importar Documentos", disabled=not uploaded_files):
         if not api_key_persisted:
-            show_notification("❌ Por favor, salve uma chave da API da OpenAI válida antes de salvar as configurações.", 'error')
+            show_notification("❌ Por favor, salve uma chave da API da OpenAI válida antes de importar documentos.", 'error')
         else:
-            config_data = {
-                "business_name": business_name,
-                "business_description": business_description,
-                "business_segment": business_segment,
-                "assistant_name": assistant_name,
-                "tone": tone,
-                "use_emojis": use_emojis,
-                "instructions": instructions,
-                "last_updated": datetime.now().isoformat(),
-            }
-            try:
-                config_manager.set_memory_dict(config_data)
-                show_notification("✅ Configurações do assistente salvas com sucesso!", 'success')
-            except Exception as e:
-                show_notification(f"❌ Erro ao salvar as configurações: {e}", 'error')
+            ingestor = KnowledgeIngestor(
+                knowledge, get_openai(api_key_persisted), redis_client
+            )
+            for uploaded_file in uploaded_files:
+                with st.status(f"Importando {uploaded_file.name}...") as status:
+                    progress = st.empty()
+                    try:
+                        stats = ingestor.ingest(
+                            uploaded_file.name,
+                            iter_paragraphs(uploaded_file.name, uploaded_file),
+                            progress=lambda s, progress=progress: progress.write(
+                                f"{s['chunks']} trechos lidos, {s['embedded']} indexados"
+                            ),
+                        )
+                        status.update(
+                            label=(
+                                f"{uploaded_file.name}: {stats['embedded']} trechos indexados, "
+                                f"{stats['skipped']} sem alteração, {stats['removed']} removidos"
+                            ),
+                            state="complete",
+                        )
+                    except Exception as e:
+                        status.update(label=f"{uploaded_file.name}: erro ao importar ({e})", state="error")
+
+    # Chunk counts kept in Redis, so listing does not scan the collection
+    sources = KnowledgeIngestor(knowledge, None, redis_client).sources()
+    if sources:
+        st.dataframe(
+            [{"Documento": name, "Trechos": count} for name, count in sorted(sources.items())],
+            use_container_width=True,
+            hide_index=True,
+        )
+        col_source, col_remove = st.columns([3, 1])
+        with col_source:
+            source_to_remove = st.selectbox("Documento", sorted(sources), label_visibility="collapsed")
+        with col_remove:
+            if st.button("🗑️ Remover", use_container_width=True):
+                KnowledgeIngestor(knowledge, None, redis_client).remove(source_to_remove)
+                st.rerun(scope="fragment")
+    else:
+        st.info("Nenhum documento importado.")
+
+
+knowledge_base_section()
 
 st.divider()
 
@@ -154,3 +246,9 @@ with col1:
 with col2:
     if st.button("Configurar WhatsApp", use_container_width=True):
         st.info("Esta funcionalidade ainda não foi implementada.") # Placeholder
+
+stats = pool_stats()
+st.caption(
+    f"Conexões Redis: {stats['in_use']} em uso, {stats['available']} livres "
+    f"(máximo {stats['max_connections']})"
+)
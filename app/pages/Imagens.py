@@ -1,6 +1,6 @@
 import json
-import os
 
+import openai
 import redis
 import streamlit as st
 
@@ -11,18 +11,16 @@ from app.prompts.templates import (
     IMAGE_GENERATION,
     LIGHTING,
 )
-from src.image import OpenAIImages, get_memory_buffer
+from app.resources import get_image_client, get_redis, invalidate_api_key
+from src.image import get_memory_buffer
 from src.memory import RedisManager
 
 # Configuração da página
 st.set_page_config(page_title="Estúdio de Imagens IA", page_icon="🎨", layout="wide")
 
-# Initialize Redis client
+# Shared Redis client, connected once per process
 try:
-    redis_client = redis.Redis.from_url(
-        os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
-    )
-    redis_client.ping()  # Check connection
+    redis_client = get_redis()
 except redis.exceptions.ConnectionError as e:
     st.error(
         f"Não foi possível conectar ao Redis. Verifique se os serviços estão rodando. Detalhes: {e}"
@@ -31,7 +29,7 @@ except redis.exceptions.ConnectionError as e:
 
 # --- API Key and Client Initialization ---
 openai_api_key_manager = RedisManager(redis_client, "secrets:openai_api_key")
-api_key = openai_api_key_manager.get_memory_dict().get('key')
+api_key = openai_api_key_manager.get_field('key')
 
 if not api_key:
     st.warning("⚠️ A chave da API da OpenAI não foi configurada.")
@@ -39,21 +37,16 @@ if not api_key:
         st.switch_page("pages/Configurações.py")
     st.stop()
 
-# Initialize OpenAI client and store in session state
-if "openai_client" not in st.session_state:
-    try:
-        st.session_state.openai_client = OpenAIImages(api_key=api_key)
-    except Exception as e:
-        st.error(
-            f"A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações. Erro: {e}"
-        )
-        if st.button("Ir para Configurações"):
-            st.switch_page("pages/Configurações.py")
-        st.stop()
-
-# Initialize config manager
-config_manager = RedisManager(redis_client, "config")
-config = config_manager.get_memory_dict()
+# Image client of this session over the shared OpenAI client of the key
+try:
+    image_client = get_image_client(api_key)
+except Exception as e:
+    st.error(
+        f"A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações. Erro: {e}"
+    )
+    if st.button("Ir para Configurações"):
+        st.switch_page("pages/Configurações.py")
+    st.stop()
 
 # Initialize Redis Manager for saved prompts
 prompts_manager = RedisManager(redis_client, "saved_prompts")
@@ -68,37 +61,52 @@ if "prompt" not in st.session_state:
 if "saved_prompts" not in st.session_state:
     st.session_state.saved_prompts = prompts_manager.get_memory_dict()
 
+
 def save_prompt(name: str, prompt_text: str) -> bool:
     """Salva um novo prompt no Redis."""
     try:
-        current_prompts = st.session_state.saved_prompts
-        current_prompts[name] = prompt_text
-        prompts_manager.set_memory_dict(current_prompts)
-        st.session_state.saved_prompts = current_prompts  # Update session state
+        prompts_manager.set_field(name, prompt_text)
+        st.session_state.saved_prompts[name] = prompt_text  # Update session state
         return True
     except Exception as e:
         st.error(f"Erro ao salvar prompt: {e}")
         return False
 
+
 def delete_prompt(name: str) -> bool:
     """Deleta um prompt salvo do Redis."""
     try:
-        current_prompts = st.session_state.saved_prompts
-        if name in current_prompts:
-            del current_prompts[name]
-            prompts_manager.set_memory_dict(current_prompts)
-            st.session_state.saved_prompts = current_prompts  # Update session state
+        if name in st.session_state.saved_prompts:
+            prompts_manager.delete_fields(name)
+            del st.session_state.saved_prompts[name]  # Update session state
         return True
     except Exception as e:
         st.error(f"Erro ao deletar prompt: {e}")
         return False
 
+
 def format_cost(cost: float) -> str:
     """Formata o custo em dólares."""
     return f"US$ {cost:.4f}"
 
+
+def load_prompt(prompt_text: str) -> None:
+    """Carrega um prompt salvo no campo de prompt."""
+    st.session_state.prompt = prompt_text
+    st.session_state.prompt_input = prompt_text
+
+
+def sync_prompt() -> None:
+    """Copia o texto digitado para o prompt guardado na sessão."""
+    st.session_state.prompt = st.session_state.prompt_input
+
+
+# Cada seção é um fragmento: interagir com ela reexecuta só a própria seção
+
 # Sidebar para gerenciar prompts salvos
-with st.sidebar:
+@st.fragment
+def saved_prompts_section() -> None:
+    """Lista, salva e remove os prompts salvos."""
     st.header("Prompts Salvos")
 
     # Seção para salvar novo prompt
@@ -114,188 +122,213 @@ with st.sidebar:
         for name, saved_prompt in list(st.session_state.saved_prompts.items()):
             col1, col2 = st.columns([3, 1])
             with col1:
-                if st.button(f"📜 {name}", key=f"load_{name}"):
-                    st.session_state.prompt = saved_prompt
+                # O campo de prompt fica em outro fragmento, então a página toda é reexecutada
+                if st.button(
+                    f"📜 {name}",
+                    key=f"load_{name}",
+                    on_click=load_prompt,
+                    args=(saved_prompt,),
+                ):
                     st.rerun()
             with col2:
                 if st.button("🗑️", key=f"delete_{name}"):
                     if delete_prompt(name):
-                        st.success(f"Prompt '{name}' deletado!")
-                        st.rerun()
+                        st.rerun(scope="fragment")
 
     st.markdown("---")
 
+
+with st.sidebar:
+    saved_prompts_section()
+
 # Título principal
 st.title("🎨 Estúdio de Imagens")
 
+
 # Seção de upload
-uploaded_files = st.file_uploader(
-    "Envie até 16 imagens (PNG, JPEG ou WebP, máximo 25MB cada)",
-    type=["png", "jpg", "jpeg", "webp"],
-    accept_multiple_files=True,
-)
+@st.fragment
+def upload_section() -> None:
+    """Recebe as imagens de referência."""
+    st.file_uploader(
+        "Envie até 16 imagens (PNG, JPEG ou WebP, máximo 25MB cada)",
+        type=["png", "jpg", "jpeg", "webp"],
+        accept_multiple_files=True,
+        key="uploaded_files",
+    )
 
-# Layout do prompt e popover
-st.header("Prompt para Geração de Imagem")
-
-st.session_state.new_prompt = st.text_area(
-    "Digite seu prompt",
-    value=st.session_state.prompt,
-    height=150,
-    help="Descreva detalhadamente a imagem que você deseja gerar",
-    placeholder="Ex: Uma paisagem serena de montanhas ao pôr do sol, com cores vibrantes e estilo impressionista...",
-)
 
-if st.session_state.new_prompt != st.session_state.prompt:
-    st.session_state.prompt = st.session_state.new_prompt
-    st.rerun()
-
-with st.popover("📝 Sugestões"):
-    # Seletor de categoria
-    category = st.radio(
-        "Escolha uma categoria:",
-        [
-            "Templates",
-            "Estilos Artísticos",
-            "Composição",
-            "Paletas de Cores",
-            "Iluminação",
-        ],
-        horizontal=True,
-        key="category_selector",
-    )
+upload_section()
 
-    st.markdown("---")
 
-    # Container com scroll para as sugestões
-    with st.container():
-        category_map = {
-            "Templates": (IMAGE_GENERATION, "🎯"),
-            "Estilos Artísticos": (ARTISTIC_STYLES, "🎨"),
-            "Composição": (COMPOSITION, "🖼️"),
-            "Paletas de Cores": (COLOR_PALETTES, "🌈"),
-            "Iluminação": (LIGHTING, "💡"),
-        }
-
-        if category in category_map:
-            items, icon = category_map[category]
-            for name, value in items.items():
-                with st.expander(f"{icon} {name}"):
-                    st.code(value, language=None)
-
-# Formulário principal
-with st.form("image_form"):
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        size = st.selectbox(
-            "Tamanho da Imagem", ["1024x1024", "1536x1024", "1024x1536"]
-        )
-    with col2:
-        quality = st.selectbox(
-            "Qualidade",
-            ["low", "medium", "high"],
-            format_func=lambda x: {"low": "Baixa", "medium": "Média", "high": "Alta"}[
-                x
+# Layout do prompt e popover
+@st.fragment
+def prompt_section() -> None:
+    """Edita o prompt e mostra as sugestões."""
+    st.header("Prompt para Geração de Imagem")
+
+    # O Streamlit apaga o estado do campo ao trocar de página; o prompt fica em
+    # st.session_state.prompt e é copiado de volta para o campo
+    if "prompt_input" not in st.session_state:
+        st.session_state.prompt_input = st.session_state.prompt
+    st.text_area(
+        "Digite seu prompt",
+        key="prompt_input",
+        on_change=sync_prompt,
+        height=150,
+        help="Descreva detalhadamente a imagem que você deseja gerar",
+        placeholder="Ex: Uma paisagem serena de montanhas ao pôr do sol, com cores vibrantes e estilo impressionista...",
+    )
+
+    with st.popover("📝 Sugestões"):
+        # Seletor de categoria
+        category = st.radio(
+            "Escolha uma categoria:",
+            [
+                "Templates",
+                "Estilos Artísticos",
+                "Composição",
+                "Paletas de Cores",
+                "Iluminação",
             ],
-        )
-    with col3:
-        background = st.selectbox(
-            "Fundo",
-            ["auto", "transparent", "opaque"],
-            format_func=lambda x: {
-                "auto": "Automático",
-                "transparent": "Transparente",
-                "opaque": "Opaco",
-            }[x],
+            horizontal=True,
+            key="category_selector",
         )
 
-    submit_button = st.form_submit_button("Processar Imagem")
-
-    if submit_button and st.session_state.prompt:
-        if not st.session_state.openai_client:
-            st.error("Cliente OpenAI não inicializado. Verifique as configurações da API.")
-        else:
-            with st.spinner("Processando..."):
-                try:
-                    if uploaded_files:
-                        if len(uploaded_files) > 16:
-                            st.error("Máximo de 16 imagens permitido.")
-                        elif uploaded_files:
-                            image_buffers = [
-                                get_memory_buffer(f.read(), f.name)
-                                for f in uploaded_files
-                            ]
-
-                            result = st.session_state.openai_client.edit(
-                                prompt=st.session_state.prompt,
-                                image=image_buffers,
-                                size=size,
-                                quality=quality,
-                                background=background,
-                            )
-
-                            st.session_state.generated_images.append(result)
-                            st.session_state.image_costs.append(
-                                st.session_state.openai_client.cost
-                            )
-                            st.success("Imagem processada com sucesso!")
-                    else:
-                        result = st.session_state.openai_client.generate(
-                            prompt=st.session_state.prompt,
-                            size=size,
-                            quality=quality,
-                            background=background,
-                        )
-                        st.session_state.generated_images.append(result)
-                        st.session_state.image_costs.append(
-                            st.session_state.openai_client.cost
-                        )
-                        st.success("Imagem gerada com sucesso!")
-                except Exception as e:
-                    st.error(f"Erro ao processar imagem: {e!s}")
-
-# Exibe imagens geradas e custos
-if st.session_state.generated_images:
-    st.header("Resultados")
-
-    # Mostra custo total
-    total_cost = sum(st.session_state.image_costs)
-    with st.sidebar:
-        st.markdown(
-            "Custo Total 💰",
-            unsafe_allow_html=True,
-        )
-        st.markdown(
-            f"<div style='text-align:center; font-size:1.5em; color:#10b981; font-weight:bold;'>"
-            f"{format_cost(total_cost)}</div>",
-            unsafe_allow_html=True,
-        )
         st.markdown("---")
 
-    # Cria colunas para exibir imagens
-    cols = st.columns(4)  # 4 imagens por linha
-    for idx, (image_bytes, cost) in enumerate(
-        zip(
-            st.session_state.generated_images,
-            st.session_state.image_costs,
-            strict=False,
+        # Container com scroll para as sugestões
+        with st.container():
+            category_map = {
+                "Templates": (IMAGE_GENERATION, "🎯"),
+                "Estilos Artísticos": (ARTISTIC_STYLES, "🎨"),
+                "Composição": (COMPOSITION, "🖼️"),
+                "Paletas de Cores": (COLOR_PALETTES, "🌈"),
+                "Iluminação": (LIGHTING, "💡"),
+            }
+
+            if category in category_map:
+                items, icon = category_map[category]
+                for name, value in items.items():
+                    with st.expander(f"{icon} {name}"):
+                        st.code(value, language=None)
+
+
+prompt_section()
+
+
+def process_image(size: str, quality: str, background: str) -> None:
+    """Edita as imagens enviadas ou gera uma nova a partir do prompt."""
+    if st.session_state.uploaded_files:
+        if len(st.session_state.uploaded_files) > 16:
+            st.error("Máximo de 16 imagens permitido.")
+            return
+        image_buffers = [
+            get_memory_buffer(f.read(), f.name)
+            for f in st.session_state.uploaded_files
+        ]
+        result = image_client.edit(
+            prompt=st.session_state.prompt,
+            image=image_buffers,
+            size=size,
+            quality=quality,
+            background=background,
         )
-    ):
-        with cols[idx % 4]:
-            st.image(image_bytes, caption=f"Imagem {idx + 1}")
-            st.caption(f"Custo: {format_cost(cost)}")
-
-            # Botão de download
-            btn = st.download_button(
-                label="Baixar Imagem",
-                data=image_bytes,
-                file_name=f"imagem_gerada_{idx + 1}.png",
-                mime="image/png",
+        message = "Imagem processada com sucesso!"
+    else:
+        result = image_client.generate(
+            prompt=st.session_state.prompt,
+            size=size,
+            quality=quality,
+            background=background,
+        )
+        message = "Imagem gerada com sucesso!"
+
+    st.session_state.generated_images.append(result)
+    st.session_state.image_costs.append(image_client.cost)
+    st.success(message)
+
+
+@st.fragment
+def studio_section() -> None:
+    """Gera as imagens e exibe a galeria de resultados."""
+    # Formulário principal
+    with st.form("image_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            size = st.selectbox(
+                "Tamanho da Imagem", ["1024x1024", "1536x1024", "1024x1536"]
+            )
+        with col2:
+            quality = st.selectbox(
+                "Qualidade",
+                ["low", "medium", "high"],
+                format_func=lambda x: {"low": "Baixa", "medium": "Média", "high": "Alta"}[
+                    x
+                ],
+            )
+        with col3:
+            background = st.selectbox(
+                "Fundo",
+                ["auto", "transparent", "opaque"],
+                format_func=lambda x: {
+                    "auto": "Automático",
+                    "transparent": "Transparente",
+                    "opaque": "Opaco",
+                }[x],
             )
 
-# Botão para limpar a sessão
-if st.session_state.generated_images:
-    if st.sidebar.button("Limpar Todas as Imagens"):
-        st.session_state.generated_images = []
-        st.session_state.image_costs = []
-        st.rerun()
+        submit_button = st.form_submit_button("Processar Imagem")
+
+        if submit_button and st.session_state.prompt:
+            if not image_client:
+                st.error("Cliente OpenAI não inicializado. Verifique as configurações da API.")
+            else:
+                with st.spinner("Processando..."):
+                    try:
+                        process_image(size, quality, background)
+                    except openai.AuthenticationError:
+                        invalidate_api_key()
+                        st.error(
+                            "A chave de API configurada é inválida ou expirou. Por favor, atualize-a na página de configurações."
+                        )
+                    except Exception as e:
+                        st.error(f"Erro ao processar imagem: {e!s}")
+
+    # Exibe imagens geradas e custos
+    if st.session_state.generated_images:
+        st.header("Resultados")
+
+        # Mostra custo total
+        total_cost = sum(st.session_state.image_costs)
+        st.metric("Custo Total 💰", format_cost(total_cost))
+
+        # Cria colunas para exibir imagens
+        cols = st.columns(4)  # 4 imagens por linha
+        for idx, (image_bytes, cost) in enumerate(
+            zip(
+                st.session_state.generated_images,
+                st.session_state.image_costs,
+                strict=False,
+            )
+        ):
+            with cols[idx % 4]:
+                st.image(image_bytes, caption=f"Imagem {idx + 1}")
+                st.caption(f"Custo: {format_cost(cost)}")
+
+                # Botão de download
+                st.download_button(
+                    label="Baixar Imagem",
+                    data=image_bytes,
+                    file_name=f"imagem_gerada_{idx + 1}.png",
+                    mime="image/png",
+                    key=f"download_{idx}",
+                )
+
+        # Botão para limpar a sessão
+        if st.button("Limpar Todas as Imagens"):
+            st.session_state.generated_images = []
+            st.session_state.image_costs = []
+            st.rerun(scope="fragment")
+
+
+studio_section()
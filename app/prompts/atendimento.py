@@ -39,3 +39,24 @@ Utilize emojis apenas se permitido.
 - Esteja atento a mudanças no tom ou uso de emojis para alinhar sempre a comunicação com as diretrizes estabelecidas.
 - Nunca invente informações sobre a empresa. Caso não tenha acesso à alguma informação, informe ao cliente que você não sabe.
 """
+
+PROMPT_RESUMO = """
+### Tarefa
+
+Resuma a conversa de atendimento via WhatsApp abaixo em português, para que o assistente possa continuar o atendimento sem ler as mensagens originais.
+
+### Instruções
+
+- Mantenha nomes, pedidos, valores, datas, endereços e compromissos assumidos.
+- Registre as dúvidas do cliente que ainda não foram resolvidas.
+- Incorpore o resumo anterior, se houver, sem repetir informações.
+- Escreva no máximo alguns parágrafos curtos, sem saudações.
+
+### Resumo anterior
+
+{summary}
+
+### Mensagens
+
+{messages}
+"""
@@ -0,0 +1,88 @@
+"""
+Streamed Reply Rendering.
+
+Render a streamed completion in Streamlit with throttled, incremental updates,
+so long answers do not resend the whole text on every token.
+"""
+
+import os
+import time
+from typing import Any
+
+STREAM_RENDER_INTERVAL_MS = int(os.getenv("STREAM_RENDER_INTERVAL_MS", "100"))
+STREAM_RENDER_MIN_CHARS = int(os.getenv("STREAM_RENDER_MIN_CHARS", "200"))
+
+CURSOR = "▌"
+
+
+class StreamRenderer:
+    """
+    Write streamed text into a Streamlit container.
+
+    Deltas are buffered and flushed at most every ``interval_ms``, or sooner
+    once ``min_chars`` characters are waiting. Finished paragraphs are written
+    once into their own element and never sent again; only the paragraph being
+    generated is updated, so a flush costs the size of that paragraph instead
+    of the whole answer. Blank lines inside a code block do not end it.
+    """
+
+    def __init__(
+        self: "StreamRenderer",
+        container: Any,
+        interval_ms: int = STREAM_RENDER_INTERVAL_MS,
+        min_chars: int = STREAM_RENDER_MIN_CHARS,
+    ) -> None:
+        """
+        Initialize the renderer.
+
+        Args:
+            container: Streamlit container the reply is written into
+            interval_ms: Minimum time between two flushes, in milliseconds
+            min_chars: Number of buffered characters that forces a flush
+        """
+        self.container = container
+        self.interval = interval_ms / 1000
+        self.min_chars = min_chars
+        self.chunks: list[str] = []
+        self.tail = ""
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        self.placeholder = container.empty()
+
+    def feed(self: "StreamRenderer", delta: str) -> None:
+        """Add streamed text, flushing it if the throttle allows."""
+        self.chunks.append(delta)
+        self.tail += delta
+        self.pending += len(delta)
+        if (
+            self.pending >= self.min_chars
+            or time.monotonic() - self.last_flush >= self.interval
+        ):
+            self._flush(CURSOR)
+
+    def close(self: "StreamRenderer") -> str:
+        """
+        Write the remaining text without the cursor.
+
+        Returns:
+            str: The whole reply
+        """
+        self._flush("")
+        return "".join(self.chunks)
+
+    def _flush(self: "StreamRenderer", cursor: str) -> None:
+        start = 0
+        while (end := self.tail.find("\n\n", start)) != -1:
+            paragraph = self.tail[:end]
+            start = end + 2
+            if paragraph.count("```") % 2:
+                continue  # Inside a code block
+            if paragraph.strip():
+                self.placeholder.markdown(paragraph)
+                self.placeholder = self.container.empty()
+            self.tail = self.tail[start:].lstrip("\n")
+            start = 0
+
+        self.placeholder.markdown(self.tail + cursor)
+        self.pending = 0
+        self.last_flush = time.monotonic()
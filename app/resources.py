@@ -0,0 +1,153 @@
+"""
+Shared Streamlit Resources.
+
+Process-wide Redis pool and API clients reused by every page, so reruns do not
+open new connections.
+"""
+
+import hashlib
+import os
+from typing import TYPE_CHECKING
+
+import openai
+import redis
+import streamlit as st
+from openai import OpenAI
+
+from app.prompts.atendimento import PROMPT_ASSISTENTE
+from src.image import OpenAIImages
+from src.prompt_registry import PromptRegistry
+
+if TYPE_CHECKING:
+    from src.knowledge import KnowledgeBase
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+API_KEY_VALIDATION_TTL = int(os.getenv("API_KEY_VALIDATION_TTL", "3600"))
+
+
+@st.cache_resource
+def get_redis_pool() -> redis.ConnectionPool:
+    """Get the connection pool shared by every page and session."""
+    return redis.ConnectionPool.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        health_check_interval=30,
+    )
+
+
+@st.cache_resource
+def get_redis() -> redis.Redis:
+    """
+    Get the shared Redis client, checking the connection once.
+
+    Raises:
+        redis.exceptions.ConnectionError: If Redis is unreachable; the failure
+            is not cached, so the next rerun tries again
+    """
+    client = redis.Redis(connection_pool=get_redis_pool())
+    client.ping()
+    return client
+
+
+@st.cache_resource(max_entries=8)
+def get_openai(api_key: str) -> OpenAI:
+    """Get the shared OpenAI client of an API key."""
+    return OpenAI(api_key=api_key)
+
+
+def validate_api_key(api_key: str) -> bool:
+    """
+    Check an OpenAI API key, reusing the result for ``API_KEY_VALIDATION_TTL``.
+
+    Only the hash of the key is part of the cache key. Network failures are
+    not cached, so the next call checks again.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        bool: Whether OpenAI accepted the key
+    """
+    if not api_key or not api_key.strip():
+        return False
+    api_key = api_key.strip()
+    try:
+        return _check_api_key(hashlib.sha256(api_key.encode()).hexdigest(), api_key)
+    except Exception:
+        return False
+
+
+def invalidate_api_key() -> None:
+    """Forget the validated keys, after a key is saved or rejected by OpenAI."""
+    _check_api_key.clear()
+
+
+@st.cache_data(ttl=API_KEY_VALIDATION_TTL, max_entries=16, show_spinner=False)
+def _check_api_key(key_hash: str, _api_key: str) -> bool:
+    # Arguments starting with an underscore are not hashed by Streamlit
+    try:
+        get_openai(_api_key).models.list()
+    except openai.AuthenticationError:
+        return False
+    return True
+
+
+def get_image_client(api_key: str) -> OpenAIImages:
+    """
+    Get the image client of the current session.
+
+    ``OpenAIImages`` keeps the last response and cost, so each session has
+    its own instance; they all share the pooled OpenAI client of the key.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        OpenAIImages: The session's image client
+    """
+    client = st.session_state.get("image_client")
+    if client is None or client.api_key != api_key:
+        client = OpenAIImages(api_key=api_key, client=get_openai(api_key))
+        st.session_state.image_client = client
+    return client
+
+
+@st.cache_resource
+def get_prompt_registry() -> PromptRegistry:
+    """Get the registry of the assistant system prompts."""
+    return PromptRegistry(get_redis(), PROMPT_ASSISTENTE)
+
+
+@st.cache_resource
+def get_knowledge_base() -> "KnowledgeBase":
+    """Get the business knowledge base."""
+    # Imported here so the pages without a knowledge base never load ChromaDB
+    from src.knowledge import KnowledgeBase
+
+    return KnowledgeBase()
+
+
+def pool_stats() -> dict:
+    """
+    Get the usage of the shared Redis connection pool.
+
+    redis-py has no public API for this, so the pool's private connection
+    sets are read; they exist in the redis-py version pinned in uv.lock
+    (5.2.1) and in 6.x. If a later version renames them, the counts read as
+    0 instead of failing.
+
+    Returns:
+        dict: Connections ``created``, ``in_use`` and ``available``, and the
+        pool's ``max_connections``
+    """
+    pool = get_redis_pool()
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    available = len(getattr(pool, "_available_connections", ()))
+    return {
+        "created": in_use + available,
+        "in_use": in_use,
+        "available": available,
+        "max_connections": pool.max_connections,
+    }
@@ -0,0 +1,320 @@
+"""
+WhatsApp Assistant Turn Processing.
+
+Run one conversation turn: load the history, call the model, store the reply
+and send it back through WAHA.
+"""
+
+import logging
+import os
+import time
+from typing import Any
+
+from src.clients import ClientRegistry, resolve_api_key
+from src.compaction import needs_compaction, schedule_compaction
+from src.context import build_context, with_tokens
+from src.conversation import ConversationStore
+from src.knowledge import KNOWLEDGE_VERSION_KEY, KnowledgeBase
+from src.memory import AsyncMemoryBatch
+from src.metrics import Metrics
+from src.prompt_registry import AsyncPromptRegistry
+from src.semantic_cache import SemanticCache
+from src.streaming import SentenceChunker
+from src.vector_store import embed
+
+logger = logging.getLogger(__name__)
+
+CHAT_EXPIRE_TIME = 3600  # 1 hour expiration
+
+# "stream" sends the reply sentence by sentence, "full" in a single message
+REPLY_MODE = os.getenv("REPLY_MODE", "stream")
+
+
+class ReplyDeliveredError(Exception):
+    """Raised when a turn fails after its reply was sent to the customer."""
+
+
+def parse_message_event(body: dict) -> dict | None:
+    """
+    Extract the fields needed to answer a WAHA ``message`` event.
+
+    Args:
+        body: The decoded webhook request body
+
+    Returns:
+        dict | None: The message data, or None if the event is not a valid message
+    """
+    if body.get("event") != "message":
+        return None
+
+    payload = body.get("payload") or {}
+    phone = payload.get("from")
+    message_content = payload.get("body")
+    if not phone or not message_content:
+        return None
+
+    return {
+        "id": payload.get("id"),
+        "phone": phone,
+        "body": message_content,
+        "timestamp": payload.get("timestamp"),
+    }
+
+
+async def process_message(
+    clients: ClientRegistry,
+    redis_client: Any,
+    phone: str,
+    message_content: str,
+    prompts: AsyncPromptRegistry,
+    answers: SemanticCache | None = None,
+    knowledge: KnowledgeBase | None = None,
+) -> str:
+    """
+    Answer a customer message and send the reply back to WhatsApp.
+
+    The opening question of a conversation is looked up in the semantic answer
+    cache first, since its answer does not depend on earlier turns. Otherwise
+    the business facts relevant to the message are retrieved from the
+    knowledge base and sent along with it.
+
+    Args:
+        clients: Shared OpenAI and WAHA clients
+        redis_client: Async Redis client instance (``redis.asyncio``)
+        phone: WhatsApp chat id of the customer
+        message_content: Text sent by the customer
+        prompts: Registry that renders the system prompt of the configuration
+        answers: Optional semantic cache of answers to opening questions
+        knowledge: Optional knowledge base of business documents
+
+    Returns:
+        str: The assistant reply
+
+    Raises:
+        ReplyDeliveredError: If the turn failed after the reply was sent; the
+            turn must not be retried, or the customer gets the reply twice
+    """
+    store = ConversationStore(redis_client, phone, expire_time=CHAT_EXPIRE_TIME)
+
+    # Get configuration, API key and chat history in one atomic round trip
+    batch = AsyncMemoryBatch(redis_client, transaction=True)
+    batch.load("config")
+    batch.load_fields("secrets:openai_api_key", "key")
+    store.load_into(batch, "chat")
+    batch.command(
+        "knowledge_version",
+        lambda pipe: pipe.get(KNOWLEDGE_VERSION_KEY),
+        lambda replies: replies[0] or "0",
+    )
+    results = await batch.execute()
+
+    config = results["config"]
+    _, summary, history = results["chat"] or await store.load()
+
+    # Assemble the current system prompt; only its version id is stored
+    prompt_version, system_prompt = await prompts.current(config)
+
+    api_key = resolve_api_key(results["secrets:openai_api_key"], config)
+    client = clients.openai(api_key)
+
+    # One embedding of the message serves the answer cache and the retrieval
+    use_cache = answers is not None and not history and not summary
+    use_knowledge = knowledge is not None and await knowledge.available()
+    embedding = None
+    if use_cache or use_knowledge:
+        embedding = await _embed_message(client, message_content)
+
+    cache_scope = f"{prompt_version}:{results['knowledge_version']}"
+    assistant_message = None
+    if use_cache:
+        assistant_message = await _lookup_answer(answers, embedding, cache_scope)
+    cached = assistant_message is not None
+
+    chunks = []
+    if use_knowledge and not cached:
+        chunks = await _retrieve_knowledge(knowledge, embedding)
+
+    # Send only the newest turns that fit in the token budget
+    user_message = with_tokens({"role": "user", "content": message_content})
+    messages, context = build_context(
+        system_prompt, history, user_message, summary=summary, knowledge=chunks
+    )
+    if context["dropped"]:
+        logger.info(
+            f"Context of {phone}: {context['tokens']} tokens, "
+            f"{context['dropped']} messages dropped "
+            f"({context['tokens_saved']} tokens saved)"
+        )
+    metrics = Metrics(redis_client, "context")
+    metrics.record("tokens", context["tokens"])
+    metrics.add("tokens_saved", context["tokens_saved"])
+
+    # Get assistant response and send it back to WhatsApp
+    if cached:
+        await clients.waha.send_text(phone, assistant_message)
+    else:
+        assistant_message = await generate_reply(
+            clients, client, redis_client, phone, messages
+        )
+
+    # The reply was delivered, so a failure from here on must not be retried
+    try:
+        # Append the new turn to the chat history
+        await store.append(
+            user_message,
+            {"role": "assistant", "content": assistant_message},
+            prompt_version=prompt_version,
+        )
+
+        # Long chats are summarized by the compactor, outside the reply path
+        if needs_compaction(history):
+            await schedule_compaction(redis_client, phone)
+    except Exception as e:
+        raise ReplyDeliveredError(f"Reply to {phone} sent but not stored: {e}") from e
+
+    if use_cache and not cached:
+        await _store_answer(
+            answers, embedding, cache_scope, message_content, assistant_message
+        )
+    return assistant_message
+
+
+async def _embed_message(client: Any, message_content: str) -> list[float] | None:
+    # Without an embedding the turn is answered without cache or knowledge
+    try:
+        return (await embed(client, [message_content]))[0]
+    except Exception as e:
+        logger.warning(f"Embedding unavailable: {e}")
+        return None
+
+
+async def _lookup_answer(
+    answers: SemanticCache, embedding: list[float] | None, scope: str
+) -> str | None:
+    if embedding is None:
+        return None
+    try:
+        return await answers.lookup(embedding, scope)
+    except Exception as e:
+        logger.warning(f"Semantic cache unavailable: {e}")
+        return None
+
+
+async def _store_answer(
+    answers: SemanticCache,
+    embedding: list[float] | None,
+    scope: str,
+    question: str,
+    answer: str,
+) -> None:
+    if embedding is None:
+        return
+    try:
+        await answers.store(embedding, scope, question, answer)
+    except Exception as e:
+        logger.warning(f"Semantic cache unavailable: {e}")
+
+
+async def _retrieve_knowledge(
+    knowledge: KnowledgeBase, embedding: list[float] | None
+) -> list[dict]:
+    if embedding is None:
+        return []
+    try:
+        return await knowledge.search(embedding)
+    except Exception as e:
+        logger.warning(f"Knowledge base unavailable: {e}")
+        return []
+
+
+async def generate_reply(
+    clients: ClientRegistry,
+    client: Any,
+    redis_client: Any,
+    phone: str,
+    messages: list[dict],
+) -> str:
+    """
+    Generate a reply and send it to WhatsApp, as set by ``REPLY_MODE``.
+
+    Args:
+        clients: Shared OpenAI and WAHA clients
+        client: OpenAI client bound to the API key
+        redis_client: Async Redis client the latency metrics are written to
+        phone: WhatsApp chat id of the customer
+        messages: Messages for the API
+
+    Returns:
+        str: The text sent to the customer
+    """
+    if REPLY_MODE == "stream":
+        # Each sentence is sent to WhatsApp as soon as it is generated
+        return await stream_reply(clients, client, redis_client, phone, messages)
+
+    response = await client.chat.completions.create(
+        model="gpt-4.1",
+        messages=messages,
+        temperature=0.7,
+    )
+    assistant_message = response.choices[0].message.content
+    await clients.waha.send_text(phone, assistant_message)
+    return assistant_message
+
+
+async def stream_reply(
+    clients: ClientRegistry,
+    client: Any,
+    redis_client: Any,
+    phone: str,
+    messages: list[dict],
+) -> str:
+    """
+    Stream a completion and send it to WhatsApp one chunk at a time.
+
+    Chunks are cut at sentence or paragraph boundaries and sent in order. If
+    the stream fails after something was sent, the turn ends with the text
+    already delivered instead of raising, so the stream is never retried.
+
+    Args:
+        clients: Shared OpenAI and WAHA clients
+        client: OpenAI client bound to the API key
+        redis_client: Async Redis client the latency metrics are written to
+        phone: WhatsApp chat id of the customer
+        messages: Messages for the API
+
+    Returns:
+        str: The text sent to the customer
+    """
+    start = time.perf_counter()
+    chunker = SentenceChunker()
+    parts: list[str] = []
+    sent: list[str] = []
+
+    async def send(chunks: list[str]) -> None:
+        for chunk in chunks:
+            await clients.waha.send_text(phone, chunk)
+            if not sent:
+                Metrics(redis_client, "reply").record(
+                    "first_chunk_ms", (time.perf_counter() - start) * 1000
+                )
+            sent.append(chunk)
+
+    try:
+        stream = await client.chat.completions.create(
+            model="gpt-4.1",
+            messages=messages,
+            temperature=0.7,
+            stream=True,
+        )
+        async for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                parts.append(event.choices[0].delta.content)
+                await send(chunker.feed(parts[-1]))
+        await send(chunker.flush())
+    except Exception as e:
+        if not sent:
+            raise
+        logger.error(f"Reply to {phone} interrupted after {len(sent)} messages: {e}")
+        return "\n\n".join(sent)
+
+    return "".join(parts).strip()
@@ -0,0 +1,82 @@
+"""
+Shared API Clients.
+
+Process-wide cache of the async OpenAI and WAHA clients used by the webhook.
+"""
+
+import os
+
+import httpx
+from openai import AsyncOpenAI
+
+from src.waha import WahaClient
+
+
+class ClientRegistry:
+    """
+    Hold one WAHA client and one ``AsyncOpenAI`` client per API key.
+
+    Every OpenAI client shares the same pooled HTTP transport, so switching keys
+    does not open new connections.
+    """
+
+    def __init__(self: "ClientRegistry", max_connections: int = 200) -> None:
+        """
+        Initialize the registry.
+
+        Args:
+            max_connections: Size of the connection pool shared by the clients
+        """
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.waha = WahaClient(max_connections=max_connections)
+        self._openai: dict[str, AsyncOpenAI] = {}
+
+    def openai(self: "ClientRegistry", api_key: str) -> AsyncOpenAI:
+        """
+        Get the cached OpenAI client for an API key.
+
+        Args:
+            api_key: OpenAI API key
+
+        Returns:
+            AsyncOpenAI: Client bound to the key
+        """
+        client = self._openai.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, http_client=self.http)
+            self._openai[api_key] = client
+        return client
+
+    async def aclose(self: "ClientRegistry") -> None:
+        """Close every connection pool held by the registry."""
+        self._openai.clear()
+        await self.http.aclose()
+        await self.waha.aclose()
+
+
+def resolve_api_key(secret: dict, config: dict) -> str:
+    """
+    Pick the OpenAI API key: the saved secret, the configuration, then the env.
+
+    Args:
+        secret: The ``secrets:openai_api_key`` hash
+        config: Assistant configuration
+
+    Returns:
+        str: The API key
+
+    Raises:
+        ValueError: If no key is configured
+    """
+    api_key = (
+        secret.get("key") or config.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    )
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in Redis or the environment")
+    return api_key
@@ -0,0 +1,284 @@
+"""
+Redis Value Codec.
+
+Encode and decode hash fields with declared types per key family, compressing
+large values.
+"""
+
+import base64
+import fnmatch
+import json
+import os
+import re
+import zlib
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ships with chromadb
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+REDIS_COMPRESSION = os.getenv("REDIS_COMPRESSION", "zlib")
+REDIS_COMPRESSION_THRESHOLD = int(os.getenv("REDIS_COMPRESSION_THRESHOLD", "1024"))
+
+# Compressed values start with this byte, which never begins a plain value
+COMPRESSED_MARKER = "\x00"
+
+if orjson is not None:
+
+    def dumps(value: Any, default: Callable | None = None) -> str:
+        """Serialize a value to a JSON string."""
+        return orjson.dumps(
+            value, default=default, option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode("utf-8")
+
+    loads = orjson.loads
+else:
+
+    def dumps(value: Any, default: Callable | None = None) -> str:
+        """Serialize a value to a JSON string."""
+        return json.dumps(value, default=default, ensure_ascii=False)
+
+    loads = json.loads
+
+
+# Field types per key pattern; "*" sets the type of undeclared fields
+SCHEMAS: dict[str, dict[str, type]] = {
+    "config": {
+        "business_name": str,
+        "business_description": str,
+        "business_segment": str,
+        "assistant_name": str,
+        "tone": str,
+        "use_emojis": bool,
+        "instructions": str,
+        "hello_message": str,
+        "timestamp": str,
+        "last_updated": str,
+        "OPENAI_API_KEY": str,
+    },
+    "secrets:*": {"*": str},
+    "saved_prompts": {"*": str},
+    "chat_history": {"messages": list, "prompt_version": str, "last_updated": str},
+}
+
+_TRUE = frozenset(("true", "True", "1", "yes"))
+_JSON_START = frozenset('[{"')
+_JSON_LITERALS = {"true": True, "false": False, "null": None}
+_INTEGER = re.compile(r"-?\d+", re.ASCII)
+_FLOAT = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?", re.ASCII)
+
+
+class Codec:
+    """
+    Typed encoder/decoder for the fields of one Redis hash.
+
+    Declared fields are converted straight to their type. Undeclared fields
+    keep the legacy behaviour (JSON, then integer, then plain string) but pick
+    the parser by looking at the value instead of trying each one in turn.
+    """
+
+    def __init__(self: "Codec", fields: dict[str, type] | None = None) -> None:
+        """
+        Initialize the codec.
+
+        Args:
+            fields: Type of each declared field; ``"*"`` applies to the others
+        """
+        self.fields = dict(fields or {})
+        self.default = self.fields.pop("*", None)
+
+    def encode(self: "Codec", field: str, value: Any) -> str:
+        """
+        Encode a value for HSET.
+
+        Args:
+            field: Name of the field
+            value: Value to store
+
+        Returns:
+            str: The encoded value
+        """
+        if isinstance(value, str):
+            return pack(value)
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int | float)):
+            return str(value)
+        return pack(dumps(value, default=_convert_types))
+
+    def decode(self: "Codec", field: str, value: str | bytes) -> Any:
+        """
+        Decode a value read from Redis.
+
+        Args:
+            field: Name of the field
+            value: Raw value
+
+        Returns:
+            The decoded value
+        """
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        value = unpack(value)
+
+        field_type = self.fields.get(field, self.default)
+        if field_type is str:
+            return value
+        if field_type is bool:
+            return value in _TRUE
+        if field_type is int:
+            return int(value)
+        if field_type is float:
+            return float(value)
+        if field_type is list or field_type is dict:
+            return loads(value)
+        return _decode_untyped(value)
+
+
+def pack(text: str, threshold: int = REDIS_COMPRESSION_THRESHOLD) -> str:
+    """
+    Compress a text value if it is larger than the threshold.
+
+    Compressed values are stored as the marker byte, one letter naming the
+    algorithm (``z`` for zlib, ``s`` for zstd) and the Base85 payload, so they
+    stay valid strings for clients using ``decode_responses``.
+
+    Args:
+        text: Value to store
+        threshold: Minimum size, in characters, to compress
+
+    Returns:
+        str: The value, compressed only if that makes it smaller
+    """
+    if REDIS_COMPRESSION == "none" or len(text) < threshold:
+        return text
+
+    raw = text.encode("utf-8")
+    if REDIS_COMPRESSION == "zstd" and zstandard is not None:
+        algorithm, payload = "s", _zstd_compressor().compress(raw)
+    else:
+        algorithm, payload = "z", zlib.compress(raw, 1)
+
+    packed = f"{COMPRESSED_MARKER}{algorithm}{base64.b85encode(payload).decode()}"
+    return packed if len(packed) < len(text) else text
+
+
+def unpack(value: str) -> str:
+    """
+    Restore a value written by ``pack``; plain values are returned unchanged.
+
+    Args:
+        value: Value read from Redis
+
+    Returns:
+        str: The original text
+    """
+    if not value.startswith(COMPRESSED_MARKER):
+        return value
+
+    payload = base64.b85decode(value[2:])
+    if value[1] == "s":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this value")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    return zlib.decompress(payload).decode("utf-8")
+
+
+def codec_for(memory_id: str) -> Codec:
+    """
+    Get the codec declared for a key.
+
+    Args:
+        memory_id: Redis key of the hash
+
+    Returns:
+        Codec: Codec of the first matching pattern in ``SCHEMAS``
+    """
+    # One codec per pattern, so per-chat keys do not grow the cache
+    pattern = next((p for p in SCHEMAS if fnmatch.fnmatchcase(memory_id, p)), None)
+    codec = _codecs.get(pattern)
+    if codec is None:
+        codec = _codecs[pattern] = Codec(SCHEMAS.get(pattern))
+    return codec
+
+
+_codecs: dict[str | None, Codec] = {}
+
+
+def _decode_untyped(value: str) -> Any:
+    if not value:
+        return value
+    if value[0] in _JSON_START:
+        try:
+            return loads(value)
+        except ValueError:
+            return value
+    if value in _JSON_LITERALS:
+        return _JSON_LITERALS[value]
+    if _INTEGER.fullmatch(value):
+        return int(value)
+    if _FLOAT.fullmatch(value):
+        return float(value)
+    return value
+
+
+def _zstd_compressor() -> Any:
+    global _zstd
+    if _zstd is None:
+        _zstd = zstandard.ZstdCompressor(level=6)
+    return _zstd
+
+
+_zstd = None
+
+
+def _convert_types(value: Any) -> Any:
+    # NumPy scalars (only needed by the json fallback) and other objects
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+if __name__ == "__main__":
+    import timeit
+
+    # Compare with the legacy decode path: python -m src.codec
+    def legacy_decode(value: str) -> Any:
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            try:
+                return int(value)
+            except ValueError:
+                return value
+
+    history = [
+        {"role": "user" if i % 2 else "assistant", "content": "Olá, tudo bem? " * 20}
+        for i in range(500)
+    ]
+    codec = codec_for("chat_history")
+    raw = json.dumps(history)
+    config = dict.fromkeys(SCHEMAS["config"], "valor de exemplo")
+
+    for name, stmt in {
+        "encode history (legacy)": lambda: json.dumps(history),
+        "encode history (codec)": lambda: codec.encode("messages", history),
+        "decode history (legacy)": lambda: legacy_decode(raw),
+        "decode history (codec)": lambda: codec.decode("messages", raw),
+        "decode config (legacy)": lambda: [legacy_decode(v) for v in config.values()],
+        "decode config (codec)": lambda: [
+            codec_for("config").decode(k, v) for k, v in config.items()
+        ],
+    }.items():
+        seconds = min(timeit.repeat(stmt, number=200, repeat=3)) / 200
+        print(f"{name:>24}: {seconds * 1e6:9.1f} µs")
+
+    packed = codec.encode("messages", history)
+    print(f"history size: {len(raw)} -> {len(packed)} characters")
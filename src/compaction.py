@@ -0,0 +1,170 @@
+"""
+Conversation Compaction.
+
+Replace the older turns of long conversations with a model-written summary,
+in the background, so replies never wait on it.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any
+
+from src.clients import ClientRegistry, resolve_api_key
+from src.context import count_tokens, with_tokens
+from src.conversation import ConversationStore
+from src.memory import AsyncMemoryBatch
+from src.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_MAX_MESSAGES = int(os.getenv("COMPACTION_MAX_MESSAGES", "40"))
+COMPACTION_MAX_TOKENS = int(os.getenv("COMPACTION_MAX_TOKENS", "6000"))
+COMPACTION_KEEP_MESSAGES = int(os.getenv("COMPACTION_KEEP_MESSAGES", "10"))
+COMPACTION_MODEL = os.getenv("COMPACTION_MODEL", "gpt-4.1-mini")
+
+# Sorted set of the chats waiting for compaction, scored by request time
+PENDING_KEY = "compaction:pending"
+
+
+def needs_compaction(history: list[dict]) -> bool:
+    """
+    Check whether a history has grown past the compaction thresholds.
+
+    Args:
+        history: Stored messages, oldest first
+
+    Returns:
+        bool: True if it has more than ``COMPACTION_MAX_MESSAGES`` messages or
+        ``COMPACTION_MAX_TOKENS`` tokens
+    """
+    if len(history) <= COMPACTION_KEEP_MESSAGES:
+        return False
+    return (
+        len(history) > COMPACTION_MAX_MESSAGES
+        or sum(with_tokens(m)["tokens"] for m in history) > COMPACTION_MAX_TOKENS
+    )
+
+
+async def schedule_compaction(redis: Any, phone: str) -> None:
+    """
+    Ask the compactor to compact a conversation.
+
+    Requests for a chat that is already waiting are merged.
+
+    Args:
+        redis: Async Redis client instance (``redis.asyncio``)
+        phone: WhatsApp chat id of the conversation
+    """
+    await redis.zadd(PENDING_KEY, {phone: time.time()}, nx=True)
+
+
+class Compactor:
+    """
+    Background job that summarizes the older turns of scheduled conversations.
+
+    The ``COMPACTION_KEEP_MESSAGES`` newest messages stay verbatim; the rest are
+    folded into the previous summary. The new summary gets the next version and
+    is swapped in atomically by ``ConversationStore.compact``, which gives up if
+    the conversation changed meanwhile; the chat is then compacted again on a
+    later turn. Results are counted in the ``metrics:compaction`` hash.
+    """
+
+    def __init__(
+        self: "Compactor",
+        redis: Any,
+        clients: ClientRegistry,
+        prompt_template: str,
+        keep_messages: int = COMPACTION_KEEP_MESSAGES,
+        model: str = COMPACTION_MODEL,
+    ) -> None:
+        """
+        Initialize the compactor.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            clients: Shared OpenAI clients
+            prompt_template: Summary prompt with ``summary`` and ``messages`` fields
+            keep_messages: Number of most recent messages kept verbatim
+            model: Model that writes the summaries
+        """
+        self.redis = redis
+        self.clients = clients
+        self.prompt_template = prompt_template
+        self.keep_messages = keep_messages
+        self.model = model
+        self.metrics = Metrics(redis, "compaction")
+
+    async def run(self: "Compactor", poll_timeout: float = 5.0) -> None:
+        """
+        Compact scheduled conversations forever, oldest request first.
+
+        Args:
+            poll_timeout: Maximum time to block waiting for a request, in seconds
+        """
+        while True:
+            try:
+                popped = await self.redis.bzpopmin(PENDING_KEY, timeout=poll_timeout)
+                if popped:
+                    await self.compact(popped[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error compacting conversation: {e}")
+                await self.metrics.incr("errors")
+                await asyncio.sleep(1)
+
+    async def compact(self: "Compactor", phone: str) -> bool:
+        """
+        Summarize the older turns of one conversation.
+
+        Args:
+            phone: WhatsApp chat id of the conversation
+
+        Returns:
+            bool: True if the history was compacted
+        """
+        store = ConversationStore(self.redis, phone)
+        batch = AsyncMemoryBatch(self.redis)
+        batch.load("config")
+        batch.load_fields("secrets:openai_api_key", "key")
+        store.load_into(batch, "chat")
+        results = await batch.execute()
+
+        _, summary, history = results["chat"] or await store.load()
+        if not needs_compaction(history):
+            return False
+
+        turns = history[: -self.keep_messages]
+        api_key = resolve_api_key(results["secrets:openai_api_key"], results["config"])
+        prompt = self.prompt_template.format(
+            summary=summary["content"] if summary else "Nenhum.",
+            messages="\n".join(f"{m['role'].upper()}: {m['content']}" for m in turns),
+        )
+        response = await self.clients.openai(api_key).chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+        )
+        content = response.choices[0].message.content
+
+        new_summary = {
+            "version": summary["version"] + 1 if summary else 1,
+            "content": content,
+            "tokens": count_tokens(content),
+        }
+        if not await store.compact(turns, new_summary):
+            await self.metrics.incr("conflicts")
+            return False
+
+        saved = sum(with_tokens(m)["tokens"] for m in turns)
+        saved -= new_summary["tokens"] - (summary["tokens"] if summary else 0)
+        await self.metrics.incr("compacted")
+        await self.metrics.incr("messages_compacted", len(turns))
+        await self.metrics.incr("tokens_saved", saved)
+        logger.info(
+            f"Compacted {len(turns)} messages of {phone} "
+            f"into summary v{new_summary['version']}"
+        )
+        return True
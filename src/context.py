@@ -0,0 +1,139 @@
+"""
+Token-Budgeted Context.
+
+Build the messages sent to the model from the system prompt and the newest
+turns that fit in a token budget.
+"""
+
+import os
+from functools import lru_cache
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "o200k_base")
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Uses ``tiktoken`` when it is installed and about four characters per token
+    otherwise.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        int: Number of tokens
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def with_tokens(message: dict) -> dict:
+    """
+    Get a message with its token count in the ``tokens`` field.
+
+    Messages that already carry a count are returned unchanged, so the count is
+    computed once, when the message is first stored.
+
+    Args:
+        message: Chat message with ``role`` and ``content``
+
+    Returns:
+        dict: The message including ``tokens``
+    """
+    if "tokens" in message:
+        return message
+    content = message.get("content") or ""
+    return {**message, "tokens": count_tokens(content) + MESSAGE_OVERHEAD}
+
+
+def build_context(
+    system_prompt: str,
+    history: list[dict],
+    message: dict,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    summary: dict | None = None,
+    knowledge: list[dict] | None = None,
+) -> tuple[list[dict], dict]:
+    """
+    Keep the system prompt, the new message and the newest turns within budget.
+
+    The system prompt, the summary of compacted turns, the retrieved knowledge
+    and the new message are always sent; older turns are dropped first once the
+    budget is spent. The knowledge goes right before the new message, so the
+    part of the prompt that repeats between turns stays a cacheable prefix.
+
+    Args:
+        system_prompt: Text of the system prompt
+        history: Stored messages, oldest first
+        message: The new user message
+        budget: Maximum number of input tokens
+        summary: Summary of the compacted turns, as stored by the compactor
+        knowledge: Knowledge base chunks relevant to the new message
+
+    Returns:
+        tuple[list[dict], dict]: The messages for the API and the statistics
+        (``tokens`` sent, ``dropped`` messages and ``tokens_saved``)
+    """
+    used = _prompt_tokens(system_prompt) + with_tokens(message)["tokens"]
+    preamble = [{"role": "system", "content": system_prompt}]
+    if summary:
+        preamble.append({"role": "system", "content": _summary_message(summary)})
+        used += summary["tokens"] + MESSAGE_OVERHEAD
+    closing = [_for_api(message)]
+    if knowledge:
+        closing.insert(0, {"role": "system", "content": _knowledge_message(knowledge)})
+        used += sum(chunk["tokens"] for chunk in knowledge) + MESSAGE_OVERHEAD
+    saved = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        tokens = with_tokens(history[i])["tokens"]
+        if used + tokens > budget:
+            saved = sum(with_tokens(m)["tokens"] for m in history[: i + 1])
+            break
+        used += tokens
+        start = i
+
+    messages = [
+        *preamble,
+        *(_for_api(m) for m in history[start:]),
+        *closing,
+    ]
+    return messages, {"tokens": used, "dropped": start, "tokens_saved": saved}
+
+
+def _summary_message(summary: dict) -> str:
+    return f"Resumo da conversa até aqui:\n{summary['content']}"
+
+
+def _knowledge_message(knowledge: list[dict]) -> str:
+    chunks = "\n\n".join(f"[{c['source']}]\n{c['content']}" for c in knowledge)
+    return f"Informações da base de conhecimento da empresa:\n\n{chunks}"
+
+
+def _for_api(message: dict) -> dict:
+    return {"role": message["role"], "content": message["content"]}
+
+
+@lru_cache(maxsize=16)
+def _prompt_tokens(system_prompt: str) -> int:
+    return count_tokens(system_prompt) + MESSAGE_OVERHEAD
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Any:
+    if tiktoken is None:
+        return None
+    return tiktoken.get_encoding(CONTEXT_ENCODING)
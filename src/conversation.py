@@ -0,0 +1,265 @@
+"""
+Conversation Store.
+
+Append-only storage of WhatsApp conversation histories in Redis lists.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any
+
+from redis.exceptions import WatchError
+
+from src.codec import dumps, loads, pack, unpack
+from src.context import with_tokens
+from src.lock import ChatLock
+
+logger = logging.getLogger(__name__)
+
+CHAT_MAX_MESSAGES = int(os.getenv("CHAT_MAX_MESSAGES", "100"))
+
+
+class ConversationStore:
+    """
+    Store each message of a conversation as one entry of a Redis list.
+
+    Messages live in ``chat:{phone}:turns`` and are written with RPUSH and capped
+    with LTRIM, so a turn costs the same however long the chat is. Each entry
+    keeps its token count in a ``tokens`` field, computed once on write. The
+    ``chat:{phone}`` hash keeps the metadata: the version id of the system
+    prompt (the text itself lives in the prompt registry), the versioned
+    summary of compacted turns and the last update.
+
+    Older histories kept the whole list JSON-encoded in the ``messages`` field of
+    the hash; they are moved to the list the first time they are loaded.
+    """
+
+    def __init__(
+        self: "ConversationStore",
+        redis: Any,
+        phone: str,
+        max_messages: int = CHAT_MAX_MESSAGES,
+        expire_time: int | None = None,
+    ) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            phone: WhatsApp chat id of the conversation
+            max_messages: Number of most recent messages kept in the list
+            expire_time: Optional expiration time in seconds, renewed on every write
+        """
+        self.redis = redis
+        self.id = f"chat:{phone}"
+        self.turns_id = f"{self.id}:turns"
+        self.max_messages = max_messages
+        self.expire_time = expire_time
+
+    async def load(
+        self: "ConversationStore", count: int | None = None
+    ) -> tuple[str | None, dict | None, list[dict]]:
+        """
+        Load the prompt version, summary and most recent messages in one round trip.
+
+        Args:
+            count: Number of most recent messages to return; all of them if None
+
+        Returns:
+            tuple[str | None, dict | None, list[dict]]: The prompt version, the
+            summary of the compacted turns and the messages
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._queue_load(pipe, count)
+            loaded = self._parse_load(await pipe.execute())
+
+        if loaded is None:
+            await self.migrate()
+            return await self.load(count)
+        return loaded
+
+    def load_into(
+        self: "ConversationStore",
+        batch: Any,
+        name: str = "chat",
+        count: int | None = None,
+    ) -> None:
+        """
+        Queue the load of the conversation in a memory batch.
+
+        The batch result under ``name`` is the same tuple returned by ``load``,
+        or None if the conversation still has to be migrated, in which case the
+        caller should fall back to ``load``.
+
+        Args:
+            batch: ``AsyncMemoryBatch`` the commands are added to
+            name: Key of the result in the batch results
+            count: Number of most recent messages to return; all of them if None
+        """
+        batch.command(
+            name, lambda pipe: self._queue_load(pipe, count), self._parse_load
+        )
+
+    def _queue_load(self: "ConversationStore", pipe: Any, count: int | None) -> None:
+        pipe.hmget(self.id, "prompt_version", "summary", "messages")
+        pipe.lrange(self.turns_id, -count if count else 0, -1)
+
+    def _parse_load(
+        self: "ConversationStore", results: list
+    ) -> tuple[str | None, dict | None, list[dict]] | None:
+        (prompt_version, summary, legacy), turns = results
+        if legacy is not None:
+            return None
+        return (
+            prompt_version,
+            loads(unpack(summary)) if summary else None,
+            [loads(unpack(turn)) for turn in turns],
+        )
+
+    async def window(self: "ConversationStore", count: int) -> list[dict]:
+        """Get the ``count`` most recent messages."""
+        return [
+            loads(unpack(turn))
+            for turn in await self.redis.lrange(self.turns_id, -count, -1)
+        ]
+
+    async def length(self: "ConversationStore") -> int:
+        """Get the number of stored messages."""
+        return await self.redis.llen(self.turns_id)
+
+    async def append(
+        self: "ConversationStore", *messages: dict, prompt_version: str | None = None
+    ) -> None:
+        """
+        Append messages to the conversation.
+
+        Args:
+            messages: Messages to append, oldest first
+            prompt_version: Version id of the system prompt used for this turn
+        """
+        metadata = {"last_updated": datetime.now().isoformat()}
+        if prompt_version is not None:
+            metadata["prompt_version"] = prompt_version
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if messages:
+                pipe.rpush(
+                    self.turns_id, *(pack(dumps(with_tokens(m))) for m in messages)
+                )
+                pipe.ltrim(self.turns_id, -self.max_messages, -1)
+            pipe.hset(self.id, mapping=metadata)
+            if self.expire_time is not None:
+                pipe.expire(self.id, self.expire_time)
+                pipe.expire(self.turns_id, self.expire_time)
+            await pipe.execute()
+
+    async def compact(
+        self: "ConversationStore", turns: list[dict], summary: dict
+    ) -> bool:
+        """
+        Replace the oldest messages with a summary in one transaction.
+
+        The swap only happens if the list still starts with ``turns`` and the
+        stored summary is the one ``summary`` replaces (``version - 1``), so a
+        turn never sees a half-compacted history and concurrent changes make
+        the compaction fail instead of losing messages.
+
+        Args:
+            turns: The oldest messages, as loaded, covered by the summary
+            summary: New summary with ``version``, ``content`` and ``tokens``
+
+        Returns:
+            bool: True if the history was compacted
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.id, self.turns_id)
+                head = await pipe.lrange(self.turns_id, 0, len(turns) - 1)
+                current = await pipe.hget(self.id, "summary")
+                version = loads(unpack(current))["version"] if current else 0
+                if (
+                    version != summary["version"] - 1
+                    or [loads(unpack(turn)) for turn in head] != turns
+                ):
+                    return False
+
+                pipe.multi()
+                pipe.ltrim(self.turns_id, len(turns), -1)
+                pipe.hset(self.id, "summary", pack(dumps(summary)))
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def reset(self: "ConversationStore") -> None:
+        """Delete the conversation."""
+        await self.redis.delete(self.id, self.turns_id)
+
+    async def migrate(self: "ConversationStore") -> bool:
+        """
+        Move a history stored in the legacy ``messages`` field to the list.
+
+        Returns:
+            bool: True if a legacy history was migrated
+        """
+        raw = await self.redis.hget(self.id, "messages")
+        if raw is None:
+            return False
+
+        try:
+            messages = loads(unpack(raw))
+        except ValueError as e:
+            logger.warning(f"Histórico inválido em {self.id}: {e}")
+            messages = []
+
+        # The system prompt is assembled from the prompt registry at call time
+        if messages and messages[0].get("role") == "system":
+            messages.pop(0)
+
+        ttl = await self.redis.ttl(self.id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.turns_id)
+            if messages:
+                pipe.rpush(
+                    self.turns_id, *(pack(dumps(with_tokens(m))) for m in messages)
+                )
+                pipe.ltrim(self.turns_id, -self.max_messages, -1)
+            pipe.hdel(self.id, "messages")
+            if ttl > 0:
+                pipe.expire(self.turns_id, ttl)
+            await pipe.execute()
+        return True
+
+
+async def migrate_all(redis: Any) -> int:
+    """
+    Migrate every legacy ``chat:{phone}`` history to the list layout.
+
+    Args:
+        redis: Async Redis client instance (``redis.asyncio``)
+
+    Returns:
+        int: Number of migrated conversations
+    """
+    migrated = 0
+    async for key in redis.scan_iter(match="chat:*", _type="hash"):
+        phone = key.removeprefix("chat:")
+        async with ChatLock(redis, phone):
+            if await ConversationStore(redis, phone).migrate():
+                migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    import redis.asyncio
+
+    async def _main() -> None:
+        client = redis.asyncio.Redis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
+        )
+        print(f"Migrated {await migrate_all(client)} conversations")
+        await client.aclose()
+
+    asyncio.run(_main())
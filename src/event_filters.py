@@ -0,0 +1,79 @@
+"""
+WAHA Event Filters.
+
+Ordered rules that drop webhook events the assistant must not answer before
+any Redis or OpenAI work is done.
+"""
+
+from collections.abc import Callable
+from typing import Any
+
+from src.metrics import Metrics
+
+# Rules are checked in order; the first one that matches drops the event
+FILTER_RULES: tuple[tuple[str, Callable[[dict, dict], bool]], ...] = (
+    ("not_message", lambda body, payload: body.get("event") != "message"),
+    ("from_me", lambda body, payload: bool(payload.get("fromMe"))),
+    (
+        "status_broadcast",
+        lambda body, payload: payload.get("from") == "status@broadcast",
+    ),
+    ("group", lambda body, payload: str(payload.get("from")).endswith("@g.us")),
+    (
+        "newsletter",
+        lambda body, payload: str(payload.get("from")).endswith("@newsletter"),
+    ),
+    (
+        "media_only",
+        lambda body, payload: bool(payload.get("hasMedia"))
+        and not str(payload.get("body") or "").strip(),
+    ),
+    (
+        "empty_body",
+        lambda body, payload: not str(payload.get("body") or "").strip(),
+    ),
+)
+
+
+class EventFilter:
+    """
+    Run ``FILTER_RULES`` over incoming events and count what each rule drops.
+
+    Counting is buffered with ``Metrics.add`` so filtering does no I/O;
+    ``flush_metrics`` adds the counts to the ``metrics:event_filter`` hash, one
+    field per rule plus ``passed`` for the events that went through.
+    """
+
+    def __init__(
+        self: "EventFilter",
+        redis: Any,
+        rules: tuple[tuple[str, Callable[[dict, dict], bool]], ...] = FILTER_RULES,
+    ) -> None:
+        """
+        Initialize the filter.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            rules: Ordered ``(name, predicate)`` pairs; a predicate receives the
+                request body and its payload and returns True to drop the event
+        """
+        self.rules = rules
+        self.metrics = Metrics(redis, "event_filter")
+
+    def check(self: "EventFilter", body: dict) -> str | None:
+        """
+        Find the rule that drops an event.
+
+        Args:
+            body: The decoded webhook request body
+
+        Returns:
+            str | None: Name of the matching rule, or None to process the event
+        """
+        payload = body.get("payload") or {}
+        for name, matches in self.rules:
+            if matches(body, payload):
+                self.metrics.add(name)
+                return name
+        self.metrics.add("passed")
+        return None
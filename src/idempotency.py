@@ -0,0 +1,79 @@
+"""
+Webhook Idempotency.
+
+Remember processed WAHA message ids so retried deliveries are answered from
+Redis instead of running the turn again.
+"""
+
+import os
+from typing import Any
+
+from src.codec import dumps, loads
+from src.metrics import Metrics
+
+WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))
+
+IN_FLIGHT = {"status": "processing"}
+
+
+class IdempotencyGuard:
+    """
+    Claim message ids with ``SET NX`` under ``webhook:seen:{id}``.
+
+    The first delivery of an id claims it and stores its result when done;
+    later deliveries get that result, or ``{"status": "processing"}`` while the
+    first one is still running. Replays, each one a completion and a WhatsApp
+    reply avoided, are counted as ``duplicates`` in ``metrics:idempotency`` when
+    the metrics are flushed.
+    """
+
+    def __init__(
+        self: "IdempotencyGuard", redis: Any, ttl: int = WEBHOOK_DEDUP_TTL
+    ) -> None:
+        """
+        Initialize the guard.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            ttl: Time a message id is remembered, in seconds
+        """
+        self.redis = redis
+        self.ttl = ttl
+        self.metrics = Metrics(redis, "idempotency")
+
+    async def claim(self: "IdempotencyGuard", message_id: str) -> dict | None:
+        """
+        Claim a message id.
+
+        Args:
+            message_id: WAHA message id (``payload.id``)
+
+        Returns:
+            dict | None: None if the caller should process the message, or the
+            cached result of the earlier delivery
+        """
+        # The GET runs after the SET, so duplicates need no second round trip
+        key = f"webhook:seen:{message_id}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, dumps(IN_FLIGHT), nx=True, ex=self.ttl)
+            pipe.get(key)
+            claimed, cached = await pipe.execute()
+        if claimed:
+            self.metrics.add("claimed")
+            return None
+
+        result = loads(cached) if cached else IN_FLIGHT
+        self.metrics.add("duplicates")
+        if result == IN_FLIGHT:
+            self.metrics.add("in_flight")
+        return result
+
+    async def complete(self: "IdempotencyGuard", message_id: str, result: dict) -> None:
+        """Store the result returned to later deliveries of a message id."""
+        await self.redis.set(
+            f"webhook:seen:{message_id}", dumps(result), xx=True, keepttl=True
+        )
+
+    async def release(self: "IdempotencyGuard", message_id: str) -> None:
+        """Forget a message id whose processing failed, so a retry runs again."""
+        await self.redis.delete(f"webhook:seen:{message_id}")
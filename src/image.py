@@ -11,14 +11,14 @@ _BACKGROUND_PARAMS = Literal["transparent", "opaque", "auto"]
 
 
 class OpenAIImages:
-    def __init__(self, api_key: str | None = None):
+    def __init__(self, api_key: str | None = None, client: OpenAI | None = None):
 
         self.api_key = api_key if api_key else os.getenv("OPENAI_API_KEY")
 
         if not self.api_key:
             raise ValueError("API key is required")
 
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = client if client else OpenAI(api_key=self.api_key)
 
         self.response = None
         self.cost = None
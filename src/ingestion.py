@@ -0,0 +1,261 @@
+"""
+Knowledge Base Ingestion.
+
+Load text, Markdown, CSV and PDF documents into the knowledge base, streaming
+the chunks and embedding only the ones that changed.
+"""
+
+import csv
+import io
+import logging
+import os
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from src.knowledge import (
+    KNOWLEDGE_SOURCES_KEY,
+    KNOWLEDGE_VERSION_KEY,
+    KnowledgeBase,
+    chunk_id,
+    iter_chunks,
+)
+from src.vector_store import EMBEDDING_MODEL
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+
+SUPPORTED_SUFFIXES = (".txt", ".md", ".csv", ".pdf")
+
+
+def iter_paragraphs(name: str, stream: BinaryIO) -> Iterator[str]:
+    """
+    Read the paragraphs of a document lazily.
+
+    CSV rows become one paragraph each, written as ``column: value`` pairs; PDF
+    pages are read one at a time.
+
+    Args:
+        name: File name, whose extension selects the reader
+        stream: Binary stream of the file
+
+    Yields:
+        str: The paragraphs, in order
+
+    Raises:
+        ValueError: If the file is a PDF and ``pypdf`` is not installed
+    """
+    suffix = Path(name).suffix.lower()
+    if suffix == ".pdf":
+        if pypdf is None:
+            raise ValueError("Install pypdf to import PDF files")
+        for page in pypdf.PdfReader(stream).pages:
+            yield from (page.extract_text() or "").split("\n\n")
+        return
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    if suffix == ".csv":
+        for row in csv.DictReader(text):
+            yield "; ".join(f"{k}: {v}" for k, v in row.items() if k and v)
+        return
+
+    lines: list[str] = []
+    for line in text:
+        if line.strip():
+            lines.append(line.rstrip())
+        elif lines:
+            yield "\n".join(lines)
+            lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+class KnowledgeIngestor:
+    """
+    Chunk, embed and store documents without holding them in memory.
+
+    Chunks are read lazily in batches of ``batch_size``. Chunks whose text is
+    already stored for the document are skipped, even if they moved; the rest
+    are embedded on a pool of ``workers`` threads, with at most two batches per
+    thread in flight, and stored as they complete.
+    """
+
+    def __init__(
+        self: "KnowledgeIngestor",
+        knowledge: KnowledgeBase,
+        client: Any,
+        redis: Any = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        workers: int = INGEST_WORKERS,
+        model: str = EMBEDDING_MODEL,
+    ) -> None:
+        """
+        Initialize the ingestor.
+
+        Args:
+            knowledge: Knowledge base the documents are stored in
+            client: Synchronous OpenAI client used for the embeddings
+            redis: Optional Redis client whose knowledge version is bumped on
+                changes, so cached answers are not reused
+            batch_size: Number of chunks per embedding request
+            workers: Number of embedding threads
+            model: OpenAI embedding model
+        """
+        self.knowledge = knowledge
+        self.client = client
+        self.redis = redis
+        self.batch_size = batch_size
+        self.workers = workers
+        self.model = model
+
+    def ingest(
+        self: "KnowledgeIngestor",
+        source: str,
+        paragraphs: Iterable[str],
+        progress: Callable[[dict], None] | None = None,
+    ) -> dict:
+        """
+        Store or update one document.
+
+        Args:
+            source: Name of the document
+            paragraphs: Paragraphs of the document, e.g. from ``iter_paragraphs``
+            progress: Optional callback receiving the statistics after each batch
+
+        Returns:
+            dict: Number of ``chunks``, ``embedded``, ``skipped`` and ``removed``
+        """
+        stats = {"chunks": 0, "embedded": 0, "skipped": 0, "removed": 0}
+        chunks = iter_chunks(paragraphs)
+        current: set[str] = set()
+        pending: set[Future] = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while batch := list(islice(chunks, self.batch_size)):
+                stats["chunks"] += len(batch)
+                current.update(chunk_id(source, chunk) for chunk in batch)
+                changed = self.knowledge.changed(source, batch)
+                stats["skipped"] += len(batch) - len(changed)
+                if changed:
+                    pending.add(pool.submit(self._embed, changed))
+
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._store(source, done, stats)
+                if progress is not None:
+                    progress(stats)
+
+            self._store(source, wait(pending).done, stats)
+
+        # Chunks edited or removed since the last import are left over
+        stats["removed"] = self.knowledge.prune(source, current)
+        if self.redis is not None:
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(KNOWLEDGE_SOURCES_KEY, source, len(current))
+                if stats["embedded"] or stats["removed"]:
+                    pipe.incr(KNOWLEDGE_VERSION_KEY)
+                pipe.execute()
+        if progress is not None:
+            progress(stats)
+        return stats
+
+    def remove(self: "KnowledgeIngestor", source: str) -> None:
+        """Remove a document from the knowledge base."""
+        self.knowledge.delete_source(source)
+        if self.redis is not None:
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hdel(KNOWLEDGE_SOURCES_KEY, source)
+                pipe.incr(KNOWLEDGE_VERSION_KEY)
+                pipe.execute()
+
+    def sources(self: "KnowledgeIngestor") -> dict[str, int]:
+        """
+        Get the stored documents and their number of chunks from Redis.
+
+        The counts are kept on every import and removal, so listing does not
+        read the collection. Documents imported before the counts existed are
+        counted once from the collection.
+
+        Returns:
+            dict[str, int]: Number of chunks of each document
+        """
+        counts = self.redis.hgetall(KNOWLEDGE_SOURCES_KEY)
+        if not counts:
+            counts = self.knowledge.sources()
+            if counts:
+                self.redis.hset(KNOWLEDGE_SOURCES_KEY, mapping=counts)
+        return {source: int(count) for source, count in counts.items()}
+
+    def _embed(
+        self: "KnowledgeIngestor", chunks: list[str]
+    ) -> tuple[list[str], list[list[float]]]:
+        response = self.client.embeddings.create(model=self.model, input=chunks)
+        return chunks, [item.embedding for item in response.data]
+
+    def _store(
+        self: "KnowledgeIngestor", source: str, done: set[Future], stats: dict
+    ) -> None:
+        # Chroma writes stay on the calling thread
+        for future in done:
+            chunks, embeddings = future.result()
+            self.knowledge.add(source, chunks, embeddings)
+            stats["embedded"] += len(chunks)
+
+
+def iter_files(paths: Iterable[str]) -> Iterator[Path]:
+    """Expand files and directories into the supported documents they contain."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(
+                p for p in path.rglob("*") if p.suffix.lower() in SUPPORTED_SUFFIXES
+            )
+        else:
+            yield path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import redis
+    from openai import OpenAI
+
+    from src.clients import resolve_api_key
+    from src.memory import MemoryBatch
+
+    # Import documents: python -m src.ingestion docs/ catalogo.csv
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Files or directories to import")
+    parser.add_argument("--remove", action="store_true", help="Remove the documents")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    client = redis.Redis.from_url(
+        os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
+    )
+    memory = (
+        MemoryBatch(client)
+        .load("config")
+        .load_fields("secrets:openai_api_key", "key")
+        .execute()
+    )
+    api_key = resolve_api_key(memory["secrets:openai_api_key"], memory["config"])
+    ingestor = KnowledgeIngestor(KnowledgeBase(), OpenAI(api_key=api_key), client)
+
+    for file in iter_files(args.paths):
+        if args.remove:
+            ingestor.remove(str(file))
+            print(f"{file}: removed")
+            continue
+        with file.open("rb") as stream:
+            stats = ingestor.ingest(str(file), iter_paragraphs(file.name, stream))
+        print(
+            f"{file}: {stats['chunks']} chunks, {stats['embedded']} embedded, "
+            f"{stats['skipped']} unchanged, {stats['removed']} removed"
+        )
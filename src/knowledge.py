@@ -0,0 +1,218 @@
+"""
+Business Knowledge Base.
+
+Store the business documents in ChromaDB and retrieve only the chunks that
+are relevant to each customer message.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from collections.abc import Iterable, Iterator
+
+from src.context import count_tokens
+from src.vector_store import CHROMA_PATH, get_chroma
+
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "4"))
+KNOWLEDGE_MAX_DISTANCE = float(os.getenv("KNOWLEDGE_MAX_DISTANCE", "0.6"))
+KNOWLEDGE_CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "1200"))
+
+# Incremented whenever the documents change, to scope cached answers
+KNOWLEDGE_VERSION_KEY = "knowledge:version"
+# Number of chunks of each stored document, kept by the ingestor
+KNOWLEDGE_SOURCES_KEY = "knowledge:sources"
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
+
+class KnowledgeBase:
+    """
+    Chunks of the business documents in the ``knowledge`` ChromaDB collection.
+
+    Every chunk keeps the name of its source document, so a document can be
+    replaced or removed as a whole, and its token count, so retrieval never
+    tokenizes it again. Its id is derived from the source and a hash of its
+    text, so re-imports only embed the chunks whose text is new, wherever
+    they moved in the document. A search returns at most ``top_k`` chunks closer than
+    ``max_distance``, which keeps the prompt the same size however many
+    documents are stored.
+
+    ChromaDB is synchronous; the async ``search`` runs it in a worker thread.
+    """
+
+    def __init__(
+        self: "KnowledgeBase",
+        path: str = CHROMA_PATH,
+        collection: str = "knowledge",
+        top_k: int = KNOWLEDGE_TOP_K,
+        max_distance: float = KNOWLEDGE_MAX_DISTANCE,
+    ) -> None:
+        """
+        Initialize the knowledge base.
+
+        Args:
+            path: Directory of the ChromaDB database
+            collection: Name of the collection holding the chunks
+            top_k: Maximum number of chunks returned by a search
+            max_distance: Maximum cosine distance of a returned chunk
+        """
+        self.collection = get_chroma(path).get_or_create_collection(
+            collection, metadata={"hnsw:space": "cosine"}, embedding_function=None
+        )
+        self.top_k = top_k
+        self.max_distance = max_distance
+
+    async def available(self: "KnowledgeBase") -> bool:
+        """Check whether any document is stored."""
+        return bool(await asyncio.to_thread(self.collection.count))
+
+    async def search(self: "KnowledgeBase", embedding: list[float]) -> list[dict]:
+        """
+        Find the chunks most relevant to a message.
+
+        Args:
+            embedding: Embedding of the customer message
+
+        Returns:
+            list[dict]: ``content``, ``source`` and ``tokens`` of each chunk,
+            closest first
+        """
+        result = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[embedding],
+            n_results=self.top_k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            {"content": document, "source": meta["source"], "tokens": meta["tokens"]}
+            for document, meta, distance in zip(
+                result["documents"][0],
+                result["metadatas"][0],
+                result["distances"][0],
+                strict=True,
+            )
+            if distance <= self.max_distance
+        ]
+
+    def add(
+        self: "KnowledgeBase",
+        source: str,
+        chunks: list[str],
+        embeddings: list[list[float]],
+    ) -> None:
+        """
+        Store chunks of a document.
+
+        Args:
+            source: Name of the document
+            chunks: Text of each chunk
+            embeddings: Embedding of each chunk
+        """
+        self.collection.upsert(
+            ids=[chunk_id(source, chunk) for chunk in chunks],
+            embeddings=embeddings,
+            documents=chunks,
+            metadatas=[
+                {"source": source, "tokens": count_tokens(chunk)} for chunk in chunks
+            ],
+        )
+
+    def changed(self: "KnowledgeBase", source: str, chunks: list[str]) -> list[str]:
+        """
+        Keep the chunks of a document that are not stored yet.
+
+        Args:
+            source: Name of the document
+            chunks: Text of each chunk
+
+        Returns:
+            list[str]: The new chunks, without repeats
+        """
+        ids = {chunk_id(source, chunk): chunk for chunk in chunks}
+        stored = set(self.collection.get(ids=list(ids), include=[])["ids"])
+        return [chunk for id_, chunk in ids.items() if id_ not in stored]
+
+    def prune(self: "KnowledgeBase", source: str, keep: set[str]) -> int:
+        """
+        Remove the chunks of a document that are no longer in it.
+
+        Args:
+            source: Name of the document
+            keep: Ids of the chunks the document has now
+
+        Returns:
+            int: Number of removed chunks
+        """
+        stored = self.collection.get(where={"source": source}, include=[])["ids"]
+        stale = [id_ for id_ in stored if id_ not in keep]
+        if stale:
+            self.collection.delete(ids=stale)
+        return len(stale)
+
+    def delete_source(self: "KnowledgeBase", source: str) -> None:
+        """Remove every chunk of a document."""
+        self.collection.delete(where={"source": source})
+
+    def sources(self: "KnowledgeBase") -> dict[str, int]:
+        """
+        Get the stored documents and their number of chunks.
+
+        Reads the metadata of every chunk; use ``KnowledgeIngestor.sources`` to
+        list the documents often.
+        """
+        counts: dict[str, int] = {}
+        for meta in self.collection.get(include=["metadatas"])["metadatas"]:
+            counts[meta["source"]] = counts.get(meta["source"], 0) + 1
+        return counts
+
+
+def chunk_text(text: str, max_chars: int = KNOWLEDGE_CHUNK_CHARS) -> list[str]:
+    """
+    Split a document into chunks of whole paragraphs.
+
+    Args:
+        text: Document text
+        max_chars: Maximum size of a chunk, in characters
+
+    Returns:
+        list[str]: The chunks, in order
+    """
+    return list(iter_chunks(_PARAGRAPH.split(text), max_chars))
+
+
+def iter_chunks(
+    paragraphs: Iterable[str], max_chars: int = KNOWLEDGE_CHUNK_CHARS
+) -> Iterator[str]:
+    """
+    Group paragraphs into chunks lazily.
+
+    Paragraphs longer than ``max_chars`` are split on their own.
+
+    Args:
+        paragraphs: Paragraphs of the document, in order
+        max_chars: Maximum size of a chunk, in characters
+
+    Yields:
+        str: The chunks, in order
+    """
+    current = ""
+    for paragraph in paragraphs:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            yield current
+            current = ""
+        while len(paragraph) > max_chars:
+            yield paragraph[:max_chars]
+            paragraph = paragraph[max_chars:]
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        yield current
+
+
+def chunk_id(source: str, chunk: str) -> str:
+    """Get the id of a chunk from its document and a hash of its text."""
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}:{digest}".encode()).hexdigest()[:32]
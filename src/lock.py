@@ -0,0 +1,114 @@
+"""
+Per-Chat Redis Lock.
+
+Lease lock that serializes the turns of one conversation without blocking the
+others.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from types import TracebackType
+from typing import Any
+
+from src.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if it still holds our token
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LockTimeoutError(Exception):
+    """Raised when a chat lock could not be acquired in time."""
+
+
+class ChatLock:
+    """
+    Lease lock on ``lock:chat:{phone}``.
+
+    The lock expires after ``lease_ms`` so a crashed worker never blocks a
+    conversation forever. Acquisitions, contended acquisitions, timeouts and
+    wait time are counted in memory for the ``metrics:chat_lock`` hash, so the
+    lock costs no extra round trips.
+    """
+
+    def __init__(
+        self: "ChatLock",
+        redis: Any,
+        phone: str,
+        lease_ms: int = 180_000,
+        timeout: float = 120.0,
+        retry_interval: float = 0.05,
+    ) -> None:
+        """
+        Initialize the lock.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            phone: WhatsApp chat id the lock protects
+            lease_ms: Time after which Redis drops a lock that was not released
+            timeout: Maximum time to wait for the lock, in seconds
+            retry_interval: Initial delay between attempts, in seconds
+        """
+        self.redis = redis
+        self.id = f"lock:chat:{phone}"
+        self.lease_ms = lease_ms
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.token = uuid.uuid4().hex
+        self.metrics = Metrics(redis, "chat_lock")
+
+    async def acquire(self: "ChatLock") -> None:
+        """
+        Wait until the lock is held.
+
+        Raises:
+            LockTimeoutError: If the lock is still taken after ``timeout`` seconds
+        """
+        start = time.monotonic()
+        delay = self.retry_interval
+        contended = False
+
+        while not await self.redis.set(self.id, self.token, nx=True, px=self.lease_ms):
+            contended = True
+            if time.monotonic() - start >= self.timeout:
+                self.metrics.add("timeouts")
+                raise LockTimeoutError(f"Timed out waiting for {self.id}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        self.metrics.add("acquired")
+        if contended:
+            self.metrics.add("contended")
+            self.metrics.record("wait_ms", (time.monotonic() - start) * 1000)
+
+    async def release(self: "ChatLock") -> None:
+        """Release the lock if it is still ours."""
+        released = await self.redis.eval(RELEASE_SCRIPT, 1, self.id, self.token)
+        if not released:
+            logger.warning(f"Lock {self.id} expired before being released")
+            self.metrics.add("expired")
+
+    async def __aenter__(self: "ChatLock") -> "ChatLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(
+        self: "ChatLock",
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        # The turn already ran; a failed release only lets the lease expire,
+        # while raising would retry a reply that was sent
+        try:
+            await self.release()
+        except Exception as e:
+            logger.error(f"Could not release {self.id}, it expires with its lease: {e}")
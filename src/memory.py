@@ -4,12 +4,17 @@ Redis Client Configuration.
 Create a redis client from configuration.
 """
 
-import json
 import logging
+import os
+from collections.abc import Callable
 from datetime import datetime
 from typing import Any
 
 import numpy as np
+import redis.asyncio
+
+from src.codec import Codec, codec_for
+from src.persistence import PersistencePolicy, default_policy
 
 logger = logging.getLogger(__name__)
 
@@ -19,45 +24,136 @@ class RedisManager:
     Manager for Redis-based memory storage and retrieval.
 
     This class provides methods to store, retrieve, and manage data in Redis.
+    The whole hash is only read by ``get_memory_dict``; the field-level methods
+    transfer just the fields they touch.
     """
 
-    def __init__(self: "RedisManager", redis: Any, memory_id: str) -> None:
+    def __init__(
+        self: "RedisManager",
+        redis: Any,
+        memory_id: str,
+        persistence: PersistencePolicy | None = None,
+        codec: Codec | None = None,
+    ) -> None:
         """
         Initialize the Redis manager.
 
         Args:
             redis: Redis client instance
             memory_id: Unique identifier for this memory in Redis
+            persistence: Policy applied after persistent writes; defaults to the
+                process-wide policy configured by ``REDIS_PERSISTENCE``
+            codec: Field codec; defaults to the schema declared for ``memory_id``
         """
         self.redis = redis
         self.id = memory_id
+        self.persistence = persistence or default_policy
+        self.codec = codec or codec_for(memory_id)
+        self.memory_dict: dict | None = None
+
+    def load(self: "RedisManager") -> dict:
+        """
+        Read the memory dictionary from Redis, replacing any cached copy.
+
+        Returns:
+            dict: The memory dictionary with decoded values
+        """
         self.memory_dict = self.redis.hgetall(name=self.id)
+        return _decode_memory_dict(self.memory_dict, self.codec)
 
     def get_memory_dict(self: "RedisManager") -> dict:
         """
-        Get the memory dictionary from Redis.
+        Get the memory dictionary, loading it from Redis on first use.
 
         Returns:
             dict: The memory dictionary with decoded values
         """
-        new_memory_dict = {}
-
-        for k, v in self.memory_dict.items():
-            try:
-                key = k.decode("utf-8") if isinstance(k, bytes) else k
-                value = v.decode("utf-8") if isinstance(v, bytes) else v
-
-                new_memory_dict[key] = json.loads(value)
-            except json.JSONDecodeError:
-                try:
-                    new_memory_dict[key] = int(value)
-                except ValueError:
-                    new_memory_dict[key] = value
-            except Exception as e:
-                logger.warning(
-                    f"Erro para coletar a memória: {e}\n\n Não conseguimos acessar a chave {key}: {value}"
-                )
-        return new_memory_dict
+        if self.memory_dict is None:
+            return self.load()
+        return _decode_memory_dict(self.memory_dict, self.codec)
+
+    def get_field(self: "RedisManager", field: str, default: Any = None) -> Any:
+        """
+        Get a single field with HGET.
+
+        Args:
+            field: Name of the field
+            default: Value returned if the field does not exist
+
+        Returns:
+            The decoded value of the field
+        """
+        value = self.redis.hget(name=self.id, key=field)
+        return default if value is None else self.codec.decode(field, value)
+
+    def get_fields(self: "RedisManager", *fields: str) -> dict:
+        """
+        Get several fields in one HMGET.
+
+        Args:
+            fields: Names of the fields
+
+        Returns:
+            dict: Decoded values of the fields that exist
+        """
+        values = self.redis.hmget(name=self.id, keys=fields)
+        return {
+            k: self.codec.decode(k, v)
+            for k, v in zip(fields, values, strict=True)
+            if v is not None
+        }
+
+    def set_field(
+        self: "RedisManager", field: str, value: Any, expire_time: int | None = None
+    ) -> None:
+        """
+        Set a single field with HSET, leaving the other fields untouched.
+
+        Args:
+            field: Name of the field
+            value: Value to store
+            expire_time: Optional expiration time in seconds. If None, data persists indefinitely
+        """
+        encoded = self.codec.encode(field, value)
+        self.redis.hset(name=self.id, key=field, value=encoded)
+        if expire_time is not None:
+            self.redis.expire(name=self.id, time=expire_time)
+        if self.memory_dict is not None:
+            self.memory_dict[field] = encoded
+        if expire_time is None:
+            self.force_save()
+
+    def delete_fields(self: "RedisManager", *fields: str) -> int:
+        """
+        Delete fields with HDEL.
+
+        Args:
+            fields: Names of the fields
+
+        Returns:
+            int: Number of deleted fields
+        """
+        deleted = self.redis.hdel(self.id, *fields)
+        if self.memory_dict is not None:
+            for field in fields:
+                self.memory_dict.pop(field, None)
+        return deleted
+
+    def increment(self: "RedisManager", field: str, amount: int = 1) -> int:
+        """
+        Increment an integer field with HINCRBY.
+
+        Args:
+            field: Name of the field
+            amount: Value added to the field
+
+        Returns:
+            int: The new value of the field
+        """
+        value = self.redis.hincrby(name=self.id, key=field, amount=amount)
+        if self.memory_dict is not None:
+            self.memory_dict[field] = str(value)
+        return value
 
     def set_memory_dict(
         self: "RedisManager", memory_dict: dict, expire_time: int | None = None
@@ -70,26 +166,19 @@ class RedisManager:
             expire_time: Optional expiration time in seconds. If None, data persists indefinitely
         """
         try:
-            new_memory_dict = {}
-
-            for k, v in memory_dict.items():
-                if isinstance(v, (list | dict)):
-                    new_memory_dict[k] = json.dumps(v, default=self.convert_types)
-                else:
-                    new_memory_dict[k] = str(v)
+            new_memory_dict = _encode_memory_dict(memory_dict, self.codec)
 
-            # Add timestamp for tracking
-            new_memory_dict["_last_updated"] = datetime.now().isoformat()
+            with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(name=self.id, mapping=new_memory_dict)
 
-            self.redis.hset(name=self.id, mapping=new_memory_dict)
-
-            # Only set expiration if specified
-            if expire_time is not None:
-                self.redis.expire(name=self.id, time=expire_time)
+                # Only set expiration if specified
+                if expire_time is not None:
+                    pipe.expire(name=self.id, time=expire_time)
+                pipe.execute()
 
             self.memory_dict = new_memory_dict
 
-            # Force save to disk if this is persistent data
+            # Flush to disk if this is persistent data
             if expire_time is None:
                 self.force_save()
 
@@ -97,12 +186,8 @@ class RedisManager:
             logger.warning(f"Erro para atualizar a memória: {e}")
 
     def force_save(self: "RedisManager") -> bool:
-        """Force Redis to save data to disk."""
-        try:
-            return self.redis.save()
-        except Exception as e:
-            logger.error(f"Error forcing save to disk: {e}")
-            return False
+        """Flush data to disk according to the persistence policy."""
+        return self.persistence.persist(self.redis)
 
     def get_last_save_time(self: "RedisManager") -> datetime | None:
         """Get the timestamp of the last successful save to disk."""
@@ -130,3 +215,420 @@ class RedisManager:
         """
         if isinstance(number, (np.int64 | np.float64)):
             return number.item()
+
+
+class AsyncRedisManager:
+    """
+    Async counterpart of ``RedisManager`` built on ``redis.asyncio``.
+
+    Nothing is read on construction; the hash is loaded by the first call to
+    ``get_memory_dict`` (or ``load``), so the event loop is never blocked.
+    """
+
+    def __init__(
+        self: "AsyncRedisManager",
+        redis: Any,
+        memory_id: str,
+        persistence: PersistencePolicy | None = None,
+        codec: Codec | None = None,
+    ) -> None:
+        """
+        Initialize the async Redis manager.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            memory_id: Unique identifier for this memory in Redis
+            persistence: Policy applied after persistent writes; defaults to the
+                process-wide policy configured by ``REDIS_PERSISTENCE``
+            codec: Field codec; defaults to the schema declared for ``memory_id``
+        """
+        self.redis = redis
+        self.id = memory_id
+        self.persistence = persistence or default_policy
+        self.codec = codec or codec_for(memory_id)
+        self.memory_dict: dict | None = None
+
+    async def load(self: "AsyncRedisManager") -> dict:
+        """
+        Read the memory dictionary from Redis, replacing any cached copy.
+
+        Returns:
+            dict: The memory dictionary with decoded values
+        """
+        self.memory_dict = await self.redis.hgetall(name=self.id)
+        return _decode_memory_dict(self.memory_dict, self.codec)
+
+    async def get_memory_dict(self: "AsyncRedisManager") -> dict:
+        """
+        Get the memory dictionary, loading it from Redis on first use.
+
+        Returns:
+            dict: The memory dictionary with decoded values
+        """
+        if self.memory_dict is None:
+            return await self.load()
+        return _decode_memory_dict(self.memory_dict, self.codec)
+
+    async def get_field(
+        self: "AsyncRedisManager", field: str, default: Any = None
+    ) -> Any:
+        """
+        Get a single field with HGET.
+
+        Args:
+            field: Name of the field
+            default: Value returned if the field does not exist
+
+        Returns:
+            The decoded value of the field
+        """
+        value = await self.redis.hget(name=self.id, key=field)
+        return default if value is None else self.codec.decode(field, value)
+
+    async def get_fields(self: "AsyncRedisManager", *fields: str) -> dict:
+        """
+        Get several fields in one HMGET.
+
+        Args:
+            fields: Names of the fields
+
+        Returns:
+            dict: Decoded values of the fields that exist
+        """
+        values = await self.redis.hmget(name=self.id, keys=fields)
+        return {
+            k: self.codec.decode(k, v)
+            for k, v in zip(fields, values, strict=True)
+            if v is not None
+        }
+
+    async def set_field(
+        self: "AsyncRedisManager",
+        field: str,
+        value: Any,
+        expire_time: int | None = None,
+    ) -> None:
+        """
+        Set a single field with HSET, leaving the other fields untouched.
+
+        Args:
+            field: Name of the field
+            value: Value to store
+            expire_time: Optional expiration time in seconds. If None, data persists indefinitely
+        """
+        encoded = self.codec.encode(field, value)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(name=self.id, key=field, value=encoded)
+            if expire_time is not None:
+                pipe.expire(name=self.id, time=expire_time)
+            await pipe.execute()
+        if self.memory_dict is not None:
+            self.memory_dict[field] = encoded
+        if expire_time is None:
+            await self.force_save()
+
+    async def delete_fields(self: "AsyncRedisManager", *fields: str) -> int:
+        """
+        Delete fields with HDEL.
+
+        Args:
+            fields: Names of the fields
+
+        Returns:
+            int: Number of deleted fields
+        """
+        deleted = await self.redis.hdel(self.id, *fields)
+        if self.memory_dict is not None:
+            for field in fields:
+                self.memory_dict.pop(field, None)
+        return deleted
+
+    async def increment(self: "AsyncRedisManager", field: str, amount: int = 1) -> int:
+        """
+        Increment an integer field with HINCRBY.
+
+        Args:
+            field: Name of the field
+            amount: Value added to the field
+
+        Returns:
+            int: The new value of the field
+        """
+        value = await self.redis.hincrby(name=self.id, key=field, amount=amount)
+        if self.memory_dict is not None:
+            self.memory_dict[field] = str(value)
+        return value
+
+    async def set_memory_dict(
+        self: "AsyncRedisManager", memory_dict: dict, expire_time: int | None = None
+    ) -> None:
+        """
+        Set memory dictionary with optional expiration.
+
+        Args:
+            memory_dict: Dictionary to store
+            expire_time: Optional expiration time in seconds. If None, data persists indefinitely
+        """
+        try:
+            new_memory_dict = _encode_memory_dict(memory_dict, self.codec)
+
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(name=self.id, mapping=new_memory_dict)
+                if expire_time is not None:
+                    pipe.expire(name=self.id, time=expire_time)
+                await pipe.execute()
+
+            self.memory_dict = new_memory_dict
+
+            # Flush to disk if this is persistent data
+            if expire_time is None:
+                await self.force_save()
+
+        except Exception as e:
+            logger.warning(f"Erro para atualizar a memória: {e}")
+
+    async def expire(self: "AsyncRedisManager", expire_time: int) -> bool:
+        """Set the expiration time of the memory, in seconds."""
+        return await self.redis.expire(name=self.id, time=expire_time)
+
+    async def force_save(self: "AsyncRedisManager") -> bool:
+        """Flush data to disk according to the persistence policy."""
+        return await self.persistence.persist_async(self.redis)
+
+    async def get_last_save_time(self: "AsyncRedisManager") -> datetime | None:
+        """Get the timestamp of the last successful save to disk."""
+        try:
+            timestamp = await self.redis.lastsave()
+            return (
+                timestamp
+                if isinstance(timestamp, datetime)
+                else datetime.fromtimestamp(timestamp)
+            )
+        except Exception as e:
+            logger.error(f"Error getting last save time: {e}")
+            return None
+
+    async def reset_memory_dict(self: "AsyncRedisManager") -> None:
+        """Clear the memory dictionary."""
+        await self.redis.delete(self.id)
+        self.memory_dict = {}
+
+
+class _BatchOperations:
+    """Operations queued by ``MemoryBatch`` and ``AsyncMemoryBatch``."""
+
+    def __init__(
+        self: "_BatchOperations",
+        redis: Any,
+        transaction: bool = False,
+        persistence: PersistencePolicy | None = None,
+    ) -> None:
+        """
+        Initialize the batch.
+
+        Args:
+            redis: Redis client instance
+            transaction: Run the batch inside MULTI/EXEC
+            persistence: Policy applied if the batch has persistent writes
+        """
+        self.redis = redis
+        self.transaction = transaction
+        self.persistence = persistence or default_policy
+        self._operations: list[tuple[str, Callable, Callable]] = []
+        self._persistent_write = False
+
+    def load(self: "_BatchOperations", memory_id: str) -> "_BatchOperations":
+        """Queue an HGETALL; the result is the decoded memory dictionary."""
+        self._operations.append(
+            (
+                memory_id,
+                lambda pipe: pipe.hgetall(name=memory_id),
+                lambda results: _decode_memory_dict(results[0], codec_for(memory_id)),
+            )
+        )
+        return self
+
+    def load_fields(
+        self: "_BatchOperations", memory_id: str, *fields: str
+    ) -> "_BatchOperations":
+        """Queue an HMGET; the result holds the decoded fields that exist."""
+        self._operations.append(
+            (
+                memory_id,
+                lambda pipe: pipe.hmget(name=memory_id, keys=fields),
+                lambda results: {
+                    k: codec_for(memory_id).decode(k, v)
+                    for k, v in zip(fields, results[0], strict=True)
+                    if v is not None
+                },
+            )
+        )
+        return self
+
+    def set(
+        self: "_BatchOperations",
+        memory_id: str,
+        memory_dict: dict,
+        expire_time: int | None = None,
+    ) -> "_BatchOperations":
+        """Queue an HSET (and EXPIRE if ``expire_time`` is given)."""
+        new_memory_dict = _encode_memory_dict(memory_dict, codec_for(memory_id))
+
+        def queue(pipe: Any) -> None:
+            pipe.hset(name=memory_id, mapping=new_memory_dict)
+            if expire_time is not None:
+                pipe.expire(name=memory_id, time=expire_time)
+
+        self._persistent_write |= expire_time is None
+        self._operations.append((memory_id, queue, lambda results: None))
+        return self
+
+    def expire(
+        self: "_BatchOperations", memory_id: str, expire_time: int
+    ) -> "_BatchOperations":
+        """Queue an EXPIRE; the result tells whether the key exists."""
+        self._operations.append(
+            (
+                memory_id,
+                lambda pipe: pipe.expire(name=memory_id, time=expire_time),
+                lambda results: bool(results[0]),
+            )
+        )
+        return self
+
+    def command(
+        self: "_BatchOperations",
+        name: str,
+        queue: Callable[[Any], None],
+        parse: Callable[[list], Any],
+    ) -> "_BatchOperations":
+        """
+        Queue custom commands.
+
+        Args:
+            name: Key of the result in the dictionary returned by ``execute``
+            queue: Function that adds the commands to the pipeline
+            parse: Function that turns the raw replies of those commands into
+                the result
+        """
+        self._operations.append((name, queue, parse))
+        return self
+
+    def _queue(self: "_BatchOperations", pipe: Any) -> list[tuple[str, int, int]]:
+        spans = []
+        for name, queue, _ in self._operations:
+            start = len(pipe.command_stack)
+            queue(pipe)
+            spans.append((name, start, len(pipe.command_stack)))
+        return spans
+
+    def _parse(
+        self: "_BatchOperations", spans: list[tuple[str, int, int]], results: list
+    ) -> dict:
+        parsed = {}
+        for (name, start, end), (_, _, parse) in zip(
+            spans, self._operations, strict=True
+        ):
+            value = parse(results[start:end])
+            if value is not None or name not in parsed:
+                parsed[name] = value
+        self._operations = []
+        return parsed
+
+
+class MemoryBatch(_BatchOperations):
+    """
+    Read and write several memory keys in one pipelined round trip.
+
+    Example:
+        results = MemoryBatch(redis).load("config").load_fields(
+            "secrets:openai_api_key", "key"
+        ).execute()
+    """
+
+    def execute(self: "MemoryBatch") -> dict:
+        """
+        Send every queued operation in one round trip.
+
+        Returns:
+            dict: Results keyed by memory id (or custom command name)
+        """
+        with self.redis.pipeline(transaction=self.transaction) as pipe:
+            spans = self._queue(pipe)
+            results = pipe.execute()
+
+        if self._persistent_write:
+            self._persistent_write = False
+            self.persistence.persist(self.redis)
+        return self._parse(spans, results)
+
+
+class AsyncMemoryBatch(_BatchOperations):
+    """Async counterpart of ``MemoryBatch`` built on ``redis.asyncio``."""
+
+    async def execute(self: "AsyncMemoryBatch") -> dict:
+        """
+        Send every queued operation in one round trip.
+
+        Returns:
+            dict: Results keyed by memory id (or custom command name)
+        """
+        async with self.redis.pipeline(transaction=self.transaction) as pipe:
+            spans = self._queue(pipe)
+            results = await pipe.execute()
+
+        if self._persistent_write:
+            self._persistent_write = False
+            await self.persistence.persist_async(self.redis)
+        return self._parse(spans, results)
+
+
+_async_clients: dict[str, redis.asyncio.Redis] = {}
+
+
+def get_async_redis(
+    url: str | None = None, max_connections: int = 100
+) -> redis.asyncio.Redis:
+    """
+    Get the process-wide async Redis client for a URL.
+
+    Every caller shares the same connection pool, so handlers never open their
+    own connections.
+
+    Args:
+        url: Redis URL; defaults to ``REDIS_URL``
+        max_connections: Size of the connection pool
+
+    Returns:
+        redis.asyncio.Redis: Client with ``decode_responses`` enabled
+    """
+    url = url or os.getenv("REDIS_URL", "redis://localhost:6379")
+    client = _async_clients.get(url)
+    if client is None:
+        pool = redis.asyncio.ConnectionPool.from_url(
+            url, decode_responses=True, max_connections=max_connections
+        )
+        client = _async_clients[url] = redis.asyncio.Redis(connection_pool=pool)
+    return client
+
+
+def _decode_memory_dict(memory_dict: dict, codec: Codec) -> dict:
+    new_memory_dict = {}
+
+    for k, v in memory_dict.items():
+        try:
+            key = k.decode("utf-8") if isinstance(k, bytes) else k
+            new_memory_dict[key] = codec.decode(key, v)
+        except Exception as e:
+            logger.warning(
+                f"Erro para coletar a memória: {e}\n\n Não conseguimos acessar a chave {k}: {v}"
+            )
+    return new_memory_dict
+
+
+def _encode_memory_dict(memory_dict: dict, codec: Codec) -> dict:
+    new_memory_dict = {k: codec.encode(k, v) for k, v in memory_dict.items()}
+
+    # Add timestamp for tracking
+    new_memory_dict["_last_updated"] = datetime.now().isoformat()
+    return new_memory_dict
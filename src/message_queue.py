@@ -0,0 +1,248 @@
+"""
+Redis Stream Message Queue.
+
+Durable queue used to decouple webhook ingestion from the LLM workers.
+"""
+
+import json
+import logging
+import os
+import zlib
+from typing import Any
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM = "webhook:messages"
+DEFAULT_GROUP = "workers"
+QUEUE_SHARDS = int(os.getenv("QUEUE_SHARDS", "16"))
+QUEUE_BURST_WINDOW_MS = int(os.getenv("QUEUE_BURST_WINDOW_MS", "1500"))
+
+
+class MessageQueue:
+    """
+    Queue backed by sharded Redis Streams and a consumer group.
+
+    Messages are routed to ``{stream}:{shard}`` by a hash of the phone, so all
+    messages of a conversation land in the same shard and keep their order as
+    long as each shard is drained by a single consumer.
+
+    Entries stay in the stream's pending list until they are acknowledged, so a
+    worker that crashes mid-turn does not lose the message.
+
+    Every message also renews a ``burst:{phone}`` key that lives for the burst
+    window, so workers can wait for a conversation to go quiet and answer
+    consecutive messages in one turn.
+    """
+
+    def __init__(
+        self: "MessageQueue",
+        redis: Any,
+        stream: str = DEFAULT_STREAM,
+        group: str = DEFAULT_GROUP,
+        shards: int = QUEUE_SHARDS,
+        max_length: int = 10_000,
+        burst_window_ms: int = QUEUE_BURST_WINDOW_MS,
+    ) -> None:
+        """
+        Initialize the queue.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            stream: Prefix of the Redis Stream keys
+            group: Name of the consumer group shared by the workers
+            shards: Number of streams the messages are spread over
+            max_length: Approximate cap applied to each stream on every XADD
+            burst_window_ms: Quiet time that ends a burst of messages; 0 disables
+        """
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.shards = shards
+        self.max_length = max_length
+        self.burst_window_ms = burst_window_ms
+
+    def shard_stream(self: "MessageQueue", shard: int) -> str:
+        """Get the stream key of a shard."""
+        return f"{self.stream}:{shard}"
+
+    def shard_for(self: "MessageQueue", phone: str) -> int:
+        """Get the shard that holds the messages of a conversation."""
+        return zlib.crc32(phone.encode("utf-8")) % self.shards
+
+    async def ensure_group(self: "MessageQueue") -> None:
+        """Create the streams and their consumer group if they do not exist yet."""
+        for shard in range(self.shards):
+            try:
+                await self.redis.xgroup_create(
+                    name=self.shard_stream(shard),
+                    groupname=self.group,
+                    id="0",
+                    mkstream=True,
+                )
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def enqueue(self: "MessageQueue", message: dict) -> str:
+        """
+        Append a message to the shard of its conversation.
+
+        Args:
+            message: JSON-serializable message data with a ``phone`` field
+
+        Returns:
+            str: The stream entry id
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                name=self.shard_stream(self.shard_for(message["phone"])),
+                fields={"data": json.dumps(message)},
+                maxlen=self.max_length,
+                approximate=True,
+            )
+            if self.burst_window_ms:
+                pipe.set(f"burst:{message['phone']}", "1", px=self.burst_window_ms)
+            results = await pipe.execute()
+        return results[0]
+
+    async def burst_wait(self: "MessageQueue", phone: str) -> float:
+        """
+        Get how long until a conversation has been quiet for the burst window.
+
+        Args:
+            phone: WhatsApp chat id of the conversation
+
+        Returns:
+            float: Remaining time in seconds; 0 if the burst is over
+        """
+        return (await self.burst_waits([phone]))[phone]
+
+    async def burst_waits(self: "MessageQueue", phones: list[str]) -> dict[str, float]:
+        """
+        Get the remaining burst window of several conversations in one round trip.
+
+        Args:
+            phones: WhatsApp chat ids of the conversations
+
+        Returns:
+            dict[str, float]: Remaining time in seconds of each chat id; 0 if
+            its burst is over
+        """
+        if not self.burst_window_ms or not phones:
+            return dict.fromkeys(phones, 0.0)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for phone in phones:
+                pipe.pttl(f"burst:{phone}")
+            ttls = await pipe.execute()
+        return {
+            phone: max(ttl, 0) / 1000 for phone, ttl in zip(phones, ttls, strict=True)
+        }
+
+    async def read(
+        self: "MessageQueue",
+        consumer: str,
+        shards: list[int],
+        count: int = 1,
+        block_ms: int | None = 5000,
+    ) -> list[tuple[str, str, dict]]:
+        """
+        Read new entries from some shards for a consumer of the group.
+
+        Args:
+            consumer: Name of the consumer reading the entries
+            shards: Shards owned by the consumer
+            count: Maximum number of entries to return per shard
+            block_ms: How long to block waiting for entries, in milliseconds;
+                None returns at once
+
+        Returns:
+            list[tuple[str, str, dict]]: Stream, entry id and decoded message
+        """
+        response = await self.redis.xreadgroup(
+            groupname=self.group,
+            consumername=consumer,
+            streams={self.shard_stream(shard): ">" for shard in shards},
+            count=count,
+            block=block_ms,
+        )
+        entries = []
+        for stream, stream_entries in response or []:
+            entries.extend(self._decode(stream, stream_entries))
+        return entries
+
+    async def claim_stale(
+        self: "MessageQueue",
+        consumer: str,
+        shards: list[int],
+        min_idle_ms: int = 60_000,
+        count: int = 10,
+    ) -> list[tuple[str, str, dict]]:
+        """
+        Take over entries left pending by consumers that stopped responding.
+
+        Args:
+            consumer: Name of the consumer claiming the entries
+            shards: Shards owned by the consumer
+            min_idle_ms: Minimum idle time for an entry to be claimed
+            count: Maximum number of entries to claim per shard
+
+        Returns:
+            list[tuple[str, str, dict]]: Stream, entry id and decoded message
+        """
+        entries = []
+        for shard in shards:
+            stream = self.shard_stream(shard)
+            response = await self.redis.xautoclaim(
+                name=stream,
+                groupname=self.group,
+                consumername=consumer,
+                min_idle_time=min_idle_ms,
+                start_id="0-0",
+                count=count,
+            )
+            entries.extend(self._decode(stream, response[1]))
+        return entries
+
+    async def ack(self: "MessageQueue", stream: str, *entry_ids: str) -> None:
+        """Acknowledge and remove processed entries of one stream."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, self.group, *entry_ids)
+            pipe.xdel(stream, *entry_ids)
+            await pipe.execute()
+
+    async def dead_letter(
+        self: "MessageQueue", stream: str, entry_id: str, message: dict, error: str
+    ) -> None:
+        """
+        Move an entry that keeps failing to the dead-letter stream.
+
+        Args:
+            stream: Stream the entry came from
+            entry_id: Id of the failed entry
+            message: Decoded message data
+            error: Description of the last error
+        """
+        await self.redis.xadd(
+            name=f"{self.stream}:dead",
+            fields={"data": json.dumps(message), "error": error},
+            maxlen=self.max_length,
+            approximate=True,
+        )
+        await self.ack(stream, entry_id)
+
+    @staticmethod
+    def _decode(stream: str, stream_entries: list) -> list[tuple[str, str, dict]]:
+        entries = []
+        for entry_id, fields in stream_entries:
+            if not fields:
+                # Entry was deleted while still pending
+                continue
+            try:
+                message = json.loads(fields["data"])
+            except (KeyError, json.JSONDecodeError) as e:
+                logger.warning(f"Entrada inválida na fila {entry_id}: {e}")
+                message = {}
+            entries.append((stream, entry_id, message))
+        return entries
@@ -0,0 +1,133 @@
+"""
+Redis Metrics.
+
+Counters shared by the API and the workers, stored as Redis hashes.
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "metrics:"
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+
+# Updates made with Metrics.add and Metrics.record, until flush_metrics
+_buffered: defaultdict[str, Counter] = defaultdict(Counter)
+
+
+class Metrics:
+    """
+    Named group of counters stored in the ``metrics:{name}`` hash.
+
+    Counters are updated with HINCRBY/HINCRBYFLOAT, so every process adds to
+    the same totals. On hot paths, ``add`` and ``record`` count in memory
+    instead, and ``flush_metrics`` writes them in one round trip.
+    """
+
+    def __init__(self: "Metrics", redis: Any, name: str) -> None:
+        """
+        Initialize the metrics group.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+            name: Name of the metrics group
+        """
+        self.redis = redis
+        self.id = f"{METRICS_PREFIX}{name}"
+
+    async def incr(self: "Metrics", field: str, amount: int = 1) -> None:
+        """Increment a counter."""
+        await self.redis.hincrby(self.id, field, amount)
+
+    async def observe(self: "Metrics", field: str, value: float) -> None:
+        """
+        Record one measurement, keeping its count and running total.
+
+        Args:
+            field: Name of the measurement
+            value: Measured value
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.id, f"{field}_count", 1)
+            pipe.hincrbyfloat(self.id, f"{field}_total", value)
+            await pipe.execute()
+
+    def add(self: "Metrics", field: str, amount: int = 1) -> None:
+        """Increment a counter in memory until the next ``flush_metrics``."""
+        _buffered[self.id][field] += amount
+
+    def record(self: "Metrics", field: str, value: float) -> None:
+        """Record one measurement in memory until the next ``flush_metrics``."""
+        counts = _buffered[self.id]
+        counts[f"{field}_count"] += 1
+        counts[f"{field}_total"] += float(value)
+
+    async def snapshot(self: "Metrics") -> dict:
+        """Get every counter of the group as numbers."""
+        return _parse(await self.redis.hgetall(self.id))
+
+
+async def flush_metrics(redis: Any) -> None:
+    """
+    Write the updates buffered by ``Metrics.add`` and ``Metrics.record``.
+
+    Updates that could not be written are kept for the next flush.
+
+    Args:
+        redis: Async Redis client instance (``redis.asyncio``)
+    """
+    pending = dict(_buffered)
+    _buffered.clear()
+    if not pending:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, counts in pending.items():
+                for field, amount in counts.items():
+                    if isinstance(amount, int):
+                        pipe.hincrby(key, field, amount)
+                    else:
+                        pipe.hincrbyfloat(key, field, amount)
+            await pipe.execute()
+    except Exception:
+        for key, counts in pending.items():
+            _buffered[key].update(counts)
+        raise
+
+
+async def flush_metrics_periodically(
+    redis: Any, interval: float = METRICS_FLUSH_INTERVAL
+) -> None:
+    """Run ``flush_metrics`` every ``interval`` seconds, forever."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_metrics(redis)
+        except Exception as e:
+            logger.error(f"Error saving metrics: {e}")
+
+
+async def read_metrics(redis: Any) -> dict:
+    """
+    Collect every metrics group stored in Redis.
+
+    Args:
+        redis: Async Redis client instance (``redis.asyncio``)
+
+    Returns:
+        dict: Counters keyed by group name
+    """
+    metrics = {}
+    async for key in redis.scan_iter(match=f"{METRICS_PREFIX}*"):
+        metrics[key.removeprefix(METRICS_PREFIX)] = _parse(await redis.hgetall(key))
+    return metrics
+
+
+def _parse(values: dict) -> dict:
+    return {
+        k: int(v) if v.lstrip("-").isdigit() else float(v) for k, v in values.items()
+    }
@@ -0,0 +1,245 @@
+"""
+Redis Persistence Policy.
+
+Decide how writes of persistent data are flushed to disk without blocking the
+Redis server.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_MODES = ("none", "bgsave", "aof", "save")
+
+REDIS_PERSISTENCE = os.getenv("REDIS_PERSISTENCE", "bgsave")
+REDIS_BGSAVE_INTERVAL = int(os.getenv("REDIS_BGSAVE_INTERVAL", "60"))
+
+
+class PersistencePolicy:
+    """
+    Flush policy applied after writes of persistent data.
+
+    Modes:
+        none: Leave persistence to the server's own ``save`` rules.
+        bgsave: Fork a ``BGSAVE`` at most once every ``interval`` seconds across
+            all processes. Writes that fall inside the window are covered by one
+            trailing ``BGSAVE`` when it ends.
+        aof: Rely on the append-only file; ``appendonly`` is enabled on first use.
+        save: Blocking ``SAVE`` on every write (stalls every Redis client).
+
+    The time spent by the client in each mode is kept in ``stats()``.
+    """
+
+    def __init__(
+        self: "PersistencePolicy",
+        mode: str = REDIS_PERSISTENCE,
+        interval: int = REDIS_BGSAVE_INTERVAL,
+    ) -> None:
+        """
+        Initialize the policy.
+
+        Args:
+            mode: One of ``none``, ``bgsave``, ``aof`` or ``save``
+            interval: Minimum time between two ``BGSAVE`` calls, in seconds
+        """
+        if mode not in PERSISTENCE_MODES:
+            raise ValueError(
+                f"Invalid persistence mode {mode!r}, use one of {PERSISTENCE_MODES}"
+            )
+        self.mode = mode
+        self.interval = interval
+        self._aof_checked = False
+        self._trailing: threading.Timer | None = None
+        self._trailing_async: asyncio.TimerHandle | None = None
+        self._trailing_task: asyncio.Future | None = None
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "saves": 0, "coalesced": 0, "latency_ms": 0.0}
+
+    def persist(self: "PersistencePolicy", redis: Any) -> bool:
+        """
+        Apply the policy after a write.
+
+        Args:
+            redis: Redis client instance
+
+        Returns:
+            bool: True if the data was or will be flushed by this policy
+        """
+        start = time.perf_counter()
+        try:
+            if self.mode == "save":
+                result = bool(redis.save())
+                self._record(saved=True)
+            elif self.mode == "bgsave":
+                result = self._bgsave(redis)
+            elif self.mode == "aof":
+                result = self._ensure_aof(redis)
+            else:
+                result = True
+            return result
+        except Exception as e:
+            logger.error(f"Error forcing save to disk: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["latency_ms"] += (time.perf_counter() - start) * 1000
+
+    async def persist_async(self: "PersistencePolicy", redis: Any) -> bool:
+        """
+        Apply the policy after a write made with an async client.
+
+        Args:
+            redis: Async Redis client instance (``redis.asyncio``)
+
+        Returns:
+            bool: True if the data was or will be flushed by this policy
+        """
+        start = time.perf_counter()
+        try:
+            if self.mode == "save":
+                result = bool(await redis.save())
+                self._record(saved=True)
+            elif self.mode == "bgsave":
+                result = await self._bgsave_async(redis)
+            elif self.mode == "aof":
+                if not self._aof_checked:
+                    config = await redis.config_get("appendonly")
+                    if config.get("appendonly") != "yes":
+                        await redis.config_set("appendonly", "yes")
+                    self._aof_checked = True
+                result = True
+            else:
+                result = True
+            return result
+        except Exception as e:
+            logger.error(f"Error forcing save to disk: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["latency_ms"] += (time.perf_counter() - start) * 1000
+
+    def stats(self: "PersistencePolicy") -> dict:
+        """
+        Get the persistence statistics of this process.
+
+        Returns:
+            dict: Mode, number of calls, saves, coalesced writes and client
+            latency (total and average, in milliseconds)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mode"] = self.mode
+        stats["avg_latency_ms"] = (
+            stats["latency_ms"] / stats["calls"] if stats["calls"] else 0.0
+        )
+        return stats
+
+    def _bgsave(self: "PersistencePolicy", redis: Any) -> bool:
+        # The key makes the window shared by every process using this Redis
+        if not redis.set("persistence:bgsave", "1", nx=True, ex=self.interval):
+            self._record(coalesced=True)
+            self._schedule_trailing(redis)
+            return True
+
+        try:
+            redis.bgsave()
+        except ResponseError as e:
+            # A save started by the server's own rules already covers this write
+            if "in progress" not in str(e):
+                raise
+        self._record(saved=True)
+        return True
+
+    def _schedule_trailing(self: "PersistencePolicy", redis: Any) -> None:
+        with self._lock:
+            if self._trailing is not None and self._trailing.is_alive():
+                return
+            delay = max(redis.pttl("persistence:bgsave"), 0) / 1000 + 0.1
+            self._trailing = threading.Timer(
+                delay, self._trailing_bgsave, args=(redis,)
+            )
+            self._trailing.daemon = True
+            self._trailing.start()
+
+    def _trailing_bgsave(self: "PersistencePolicy", redis: Any) -> None:
+        try:
+            self._bgsave(redis)
+        except Exception as e:
+            logger.error(f"Error forcing save to disk: {e}")
+
+    async def _bgsave_async(self: "PersistencePolicy", redis: Any) -> bool:
+        if not await redis.set("persistence:bgsave", "1", nx=True, ex=self.interval):
+            self._record(coalesced=True)
+            if self._trailing_async is None or self._trailing_async.cancelled():
+                delay = max(await redis.pttl("persistence:bgsave"), 0) / 1000 + 0.1
+                self._trailing_async = asyncio.get_running_loop().call_later(
+                    delay, self._start_trailing_async, redis
+                )
+            return True
+
+        try:
+            await redis.bgsave()
+        except ResponseError as e:
+            if "in progress" not in str(e):
+                raise
+        self._record(saved=True)
+        return True
+
+    def _start_trailing_async(self: "PersistencePolicy", redis: Any) -> None:
+        self._trailing_async = None
+        self._trailing_task = asyncio.ensure_future(self._bgsave_async(redis))
+        self._trailing_task.add_done_callback(self._log_trailing_error)
+
+    @staticmethod
+    def _log_trailing_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error forcing save to disk: {task.exception()}")
+
+    def _ensure_aof(self: "PersistencePolicy", redis: Any) -> bool:
+        if not self._aof_checked:
+            if redis.config_get("appendonly").get("appendonly") != "yes":
+                redis.config_set("appendonly", "yes")
+            self._aof_checked = True
+        return True
+
+    def _record(
+        self: "PersistencePolicy", saved: bool = False, coalesced: bool = False
+    ) -> None:
+        with self._lock:
+            self._stats["saves"] += int(saved)
+            self._stats["coalesced"] += int(coalesced)
+
+
+default_policy = PersistencePolicy()
+
+
+if __name__ == "__main__":
+    import sys
+
+    import redis
+
+    # Compare the client latency added by each mode: python -m src.persistence
+    client = redis.Redis.from_url(
+        os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True
+    )
+    for mode in sys.argv[1:] or ["none", "bgsave", "save"]:
+        client.delete("persistence:bgsave")
+        policy = PersistencePolicy(mode=mode)
+        for i in range(50):
+            client.hset("persistence:benchmark", "value", i)
+            policy.persist(client)
+        stats = policy.stats()
+        print(
+            f"{mode:>6}: {stats['avg_latency_ms']:.2f} ms/write "
+            f"({stats['saves']} saves, {stats['coalesced']} coalesced)"
+        )
+    client.delete("persistence:benchmark")
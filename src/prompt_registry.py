@@ -0,0 +1,160 @@
+"""
+System Prompt Registry.
+
+Render system prompts once per configuration and store them by content hash,
+so conversations only keep a short version id.
+"""
+
+import hashlib
+from string import Formatter
+from typing import Any
+
+from src.codec import dumps, pack, unpack
+
+PROMPT_PREFIX = "prompt:"
+
+
+class _PromptCache:
+    """Rendering and in-process cache shared by both registries."""
+
+    def __init__(
+        self: "_PromptCache",
+        redis: Any,
+        template: str,
+        expire_time: int | None = None,
+        max_cached: int = 64,
+    ) -> None:
+        """
+        Initialize the registry.
+
+        Args:
+            redis: Redis client instance
+            template: Prompt template formatted with the configuration
+            expire_time: Optional expiration time of the stored prompts, in seconds
+            max_cached: Number of rendered prompts kept in memory
+        """
+        self.redis = redis
+        self.template = template
+        self.expire_time = expire_time
+        self.max_cached = max_cached
+        self.fields = sorted(
+            {name for _, name, _, _ in Formatter().parse(template) if name}
+        )
+        self._by_config: dict[str, str] = {}
+        self._by_version: dict[str, str] = {}
+
+    def render(self: "_PromptCache", config: dict) -> tuple[str, str, bool]:
+        """
+        Render the prompt for a configuration, reusing a cached render.
+
+        Only the fields used by the template are considered, so saving the
+        configuration without changing them keeps the same version.
+
+        Args:
+            config: Assistant configuration
+
+        Returns:
+            tuple[str, str, bool]: Version id, prompt text and whether it was
+            rendered now (and still has to be stored)
+        """
+        values = {field: config.get(field, "") for field in self.fields}
+        fingerprint = dumps(values)
+
+        version = self._by_config.get(fingerprint)
+        if version is not None:
+            return version, self._by_version[version], False
+
+        text = self.template.format(**values)
+        version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        self._remember(version, text)
+        self._by_config[fingerprint] = version
+        return version, text, True
+
+    def _remember(self: "_PromptCache", version: str, text: str) -> None:
+        if len(self._by_version) >= self.max_cached:
+            self._by_config.clear()
+            self._by_version.clear()
+        self._by_version[version] = text
+
+
+class PromptRegistry(_PromptCache):
+    """
+    Registry of rendered system prompts stored under ``prompt:{version}``.
+
+    The version id is a hash of the rendered text, so identical configurations
+    share one stored prompt.
+    """
+
+    def current(self: "PromptRegistry", config: dict) -> tuple[str, str]:
+        """
+        Get the prompt of the current configuration, storing it if it is new.
+
+        Args:
+            config: Assistant configuration
+
+        Returns:
+            tuple[str, str]: Version id and prompt text
+        """
+        version, text, rendered = self.render(config)
+        if rendered:
+            self.redis.set(
+                f"{PROMPT_PREFIX}{version}", pack(text), ex=self.expire_time, nx=True
+            )
+        return version, text
+
+    def get(self: "PromptRegistry", version: str) -> str | None:
+        """
+        Get a stored prompt by version id.
+
+        Args:
+            version: Version id returned by ``current``
+
+        Returns:
+            str | None: The prompt text, or None if it is unknown
+        """
+        text = self._by_version.get(version)
+        if text is None:
+            raw = self.redis.get(f"{PROMPT_PREFIX}{version}")
+            if raw is not None:
+                text = unpack(raw)
+                self._remember(version, text)
+        return text
+
+
+class AsyncPromptRegistry(_PromptCache):
+    """Async counterpart of ``PromptRegistry`` built on ``redis.asyncio``."""
+
+    async def current(self: "AsyncPromptRegistry", config: dict) -> tuple[str, str]:
+        """
+        Get the prompt of the current configuration, storing it if it is new.
+
+        Args:
+            config: Assistant configuration
+
+        Returns:
+            tuple[str, str]: Version id and prompt text
+        """
+        version, text, rendered = self.render(config)
+        if rendered:
+            await self.redis.set(
+                f"{PROMPT_PREFIX}{version}", pack(text), ex=self.expire_time, nx=True
+            )
+        return version, text
+
+    async def get(self: "AsyncPromptRegistry", version: str) -> str | None:
+        """
+        Get a stored prompt by version id.
+
+        Args:
+            version: Version id returned by ``current``
+
+        Returns:
+            str | None: The prompt text, or None if it is unknown
+        """
+        text = self._by_version.get(version)
+        if text is None:
+            raw = await self.redis.get(f"{PROMPT_PREFIX}{version}")
+            if raw is not None:
+                text = unpack(raw)
+                self._remember(version, text)
+        return text
@@ -0,0 +1,155 @@
+"""
+Semantic Answer Cache.
+
+Reuse the answers to questions that mean the same thing, stored in the bundled
+ChromaDB, so repeated customer questions skip the model.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any
+
+from src.metrics import Metrics
+from src.vector_store import CHROMA_PATH, get_chroma
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "true").lower() in ("true", "1", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "604800"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SemanticCache:
+    """
+    Answers keyed by the embedding of the question, in a ChromaDB collection.
+
+    Entries are scoped to the versions of the system prompt and of the
+    knowledge base, so changing the business configuration or documents never
+    serves answers written for the old ones. Entries older
+    than ``ttl`` are ignored and purged, and the oldest ones are evicted once
+    the collection grows past ``max_entries``. Hits, misses, stores and
+    evictions are counted in ``metrics:semantic_cache``.
+
+    ChromaDB is synchronous, so its calls run in a worker thread.
+    """
+
+    def __init__(
+        self: "SemanticCache",
+        redis: Any,
+        path: str = CHROMA_PATH,
+        collection: str = "answer_cache",
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            redis: Async Redis client where the metrics are kept
+            path: Directory of the ChromaDB database
+            collection: Name of the collection holding the answers
+            threshold: Minimum cosine similarity for a hit
+            ttl: Time an answer can be reused, in seconds
+            max_entries: Number of answers kept in the collection
+        """
+        self.collection = get_chroma(path).get_or_create_collection(
+            collection, metadata={"hnsw:space": "cosine"}, embedding_function=None
+        )
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = Metrics(redis, "semantic_cache")
+        self._lock = asyncio.Lock()
+
+    async def lookup(
+        self: "SemanticCache", embedding: list[float], scope: str
+    ) -> str | None:
+        """
+        Find the answer of the closest question asked in the same scope.
+
+        Args:
+            embedding: Embedding of the question
+            scope: Versions of the current system prompt and knowledge base
+
+        Returns:
+            str | None: The cached answer, or None on a miss
+        """
+        result = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=[embedding],
+            n_results=1,
+            where={
+                "$and": [
+                    {"scope": scope},
+                    {"created_at": {"$gte": time.time() - self.ttl}},
+                ]
+            },
+            include=["metadatas", "distances"],
+        )
+        if result["ids"][0] and 1 - result["distances"][0][0] >= self.threshold:
+            self.metrics.add("hits")
+            return result["metadatas"][0][0]["answer"]
+
+        self.metrics.add("misses")
+        return None
+
+    async def store(
+        self: "SemanticCache",
+        embedding: list[float],
+        scope: str,
+        question: str,
+        answer: str,
+    ) -> None:
+        """
+        Store the answer to a question and evict old entries if needed.
+
+        Args:
+            embedding: Embedding of the question
+            scope: Versions of the system prompt and knowledge base used
+            question: Question sent by the customer
+            answer: Assistant reply
+        """
+        entry_id = hashlib.sha256(f"{scope}:{question}".encode()).hexdigest()
+        await asyncio.to_thread(
+            self.collection.upsert,
+            ids=[entry_id],
+            embeddings=[embedding],
+            documents=[question],
+            metadatas=[
+                {
+                    "scope": scope,
+                    "answer": answer,
+                    "created_at": time.time(),
+                }
+            ],
+        )
+        self.metrics.add("stores")
+
+        # Evict in steps of 10% so the scan is not repeated on every store
+        if await asyncio.to_thread(self.collection.count) > self.max_entries * 1.1:
+            async with self._lock:
+                evicted = await asyncio.to_thread(self._evict)
+            self.metrics.add("evicted", evicted)
+
+    def _evict(self: "SemanticCache") -> int:
+        count = self.collection.count()
+        self.collection.delete(where={"created_at": {"$lt": time.time() - self.ttl}})
+        expired = count - self.collection.count()
+
+        entries = self.collection.get(include=["metadatas"])
+        excess = len(entries["ids"]) - self.max_entries
+        if excess <= 0:
+            return expired
+
+        oldest = sorted(
+            zip(entries["ids"], entries["metadatas"], strict=True),
+            key=lambda entry: entry[1]["created_at"],
+        )[:excess]
+        self.collection.delete(ids=[entry_id for entry_id, _ in oldest])
+        logger.info(f"Evicted {expired + excess} cached answers")
+        return expired + excess
@@ -0,0 +1,64 @@
+"""
+Streamed Reply Chunking.
+
+Cut a streamed completion into sentence and paragraph chunks that can be sent
+as separate WhatsApp messages while the rest is still being generated.
+"""
+
+import os
+import re
+
+REPLY_CHUNK_MIN_CHARS = int(os.getenv("REPLY_CHUNK_MIN_CHARS", "80"))
+
+# A blank line ends a paragraph; whitespace after .!? or … ends a sentence
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?…])\s+")
+
+
+class SentenceChunker:
+    """
+    Buffer streamed text and release it at sentence or paragraph boundaries.
+
+    Paragraphs are always released. Sentences are held until the chunk has at
+    least ``min_chars`` characters, so short sentences are grouped instead of
+    becoming one message each.
+    """
+
+    def __init__(
+        self: "SentenceChunker", min_chars: int = REPLY_CHUNK_MIN_CHARS
+    ) -> None:
+        """
+        Initialize the chunker.
+
+        Args:
+            min_chars: Minimum size of a chunk cut at a sentence boundary
+        """
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self: "SentenceChunker", text: str) -> list[str]:
+        """
+        Add streamed text.
+
+        Args:
+            text: Next delta of the completion
+
+        Returns:
+            list[str]: Chunks completed by this text, in order
+        """
+        self.buffer += text
+        chunks = []
+        start = 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            end = match.start()
+            chunk = self.buffer[start:end].strip()
+            if match.group().count("\n") > 1 or len(chunk) >= self.min_chars:
+                if chunk:
+                    chunks.append(chunk)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return chunks
+
+    def flush(self: "SentenceChunker") -> list[str]:
+        """Get the text left after the stream ended."""
+        chunk, self.buffer = self.buffer.strip(), ""
+        return [chunk] if chunk else []
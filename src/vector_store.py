@@ -0,0 +1,58 @@
+"""
+Vector Store Helpers.
+
+Shared ChromaDB client and OpenAI embeddings used by the semantic answer cache
+and the knowledge base.
+"""
+
+import os
+from functools import lru_cache
+from typing import Any
+
+import chromadb
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chromadb")
+# When set, every process connects to this Chroma server instead of CHROMA_PATH
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+
+@lru_cache(maxsize=4)
+def get_chroma(path: str = CHROMA_PATH) -> Any:
+    """
+    Get the process-wide ChromaDB client.
+
+    With ``CHROMA_HOST`` set, the client talks to that Chroma server, which
+    owns the store; use it whenever more than one process reads or writes the
+    collections, since an embedded database is not safe to share between
+    processes and does not see the writes of the others. Without it, the
+    database in ``path`` is opened in this process, for local use.
+
+    Args:
+        path: Directory of the embedded ChromaDB database
+
+    Returns:
+        chromadb.ClientAPI: The shared client
+    """
+    if CHROMA_HOST:
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    return chromadb.PersistentClient(path=path)
+
+
+async def embed(
+    client: Any, texts: list[str], model: str = EMBEDDING_MODEL
+) -> list[list[float]]:
+    """
+    Embed texts in one request.
+
+    Args:
+        client: Async OpenAI client bound to the API key
+        texts: Texts to embed
+        model: OpenAI embedding model
+
+    Returns:
+        list[list[float]]: One embedding per text, in order
+    """
+    response = await client.embeddings.create(model=model, input=texts)
+    return [item.embedding for item in response.data]
@@ -0,0 +1,73 @@
+"""
+WAHA Client.
+
+Async client for the WhatsApp HTTP API used to send the assistant replies.
+"""
+
+import os
+
+import httpx
+
+WAHA_URL = os.getenv("WAHA_URL", "http://waha:3000")
+
+
+class WahaClient:
+    """
+    Send messages through WAHA using a pooled ``httpx.AsyncClient``.
+
+    The client is meant to be created once per process and shared by every
+    conversation.
+    """
+
+    def __init__(
+        self: "WahaClient",
+        base_url: str = WAHA_URL,
+        session: str = "default",
+        max_connections: int = 100,
+        timeout: float = 30.0,
+    ) -> None:
+        """
+        Initialize the WAHA client.
+
+        Args:
+            base_url: Base URL of the WAHA service
+            session: WAHA session used to send the messages
+            max_connections: Size of the HTTP connection pool
+            timeout: Request timeout in seconds
+        """
+        self.session = session
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def send_text(self: "WahaClient", chat_id: str, text: str) -> dict:
+        """
+        Send a text message to a chat.
+
+        Args:
+            chat_id: WhatsApp chat id of the recipient
+            text: Message text
+
+        Returns:
+            dict: The WAHA response body
+        """
+        response = await self.http.post(
+            "/api/sendText",
+            json={
+                "session": self.session,
+                "chatId": chat_id,
+                "text": text,
+                "linkPreview": False,
+            },
+        )
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    async def aclose(self: "WahaClient") -> None:
+        """Close the underlying connection pool."""
+        await self.http.aclose()